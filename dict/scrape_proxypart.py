@@ -1,51 +1,87 @@
 from selenium import webdriver
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support.ui import Select, WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import httpx
+import os
 import time
 import json
+import sys
 
 target_brands = [
     'Audi', 'BMW', 'Mercedes', 'Volkswagen', 'Porsche',
-    'Cupra', 'Skoda', 'Seat', 'Mini', 'Lamborghini', 
+    'Cupra', 'Skoda', 'Seat', 'Mini', 'Lamborghini',
     'Bentley', 'Aston Martin'
 ]
 
-driver = webdriver.Chrome()
-wait = WebDriverWait(driver, 10)
+# PROXYPARTS_WIKI_URL points the crawler at a stand-in site (bench_crawl.py)
+WIKI_URL = os.environ.get("PROXYPARTS_WIKI_URL", "https://www.proxyparts.com/wiki/engine-codes/")
+OUTPUT_FILE = "engine_codes.json"
 
-driver.get("https://www.proxyparts.com/wiki/engine-codes/")
+headers = {
+    "User-Agent": "Mozilla/5.0 (Python scraper)"
+}
 
-# --- Close cookie modal ---
-try:
-    close_btn = wait.until(EC.element_to_be_clickable((By.ID, "btCloseCookie")))
-    close_btn.click()
-    time.sleep(0.5)
-except:
-    pass
+# HTTP mode (--http): the browser only discovers the make/model lists;
+# model pages are static and are fetched concurrently over one pooled
+# client, at most REQUESTS_PER_SECOND request starts per second
+HTTP_CONCURRENCY = 8
+REQUESTS_PER_SECOND = 4.0
 
-# --- Get all makes from <select> and filter by target_brands ---
-make_select = driver.find_element(By.ID, "objmake")
-all_makes = [option.get_attribute("value") for option in make_select.find_elements(By.TAG_NAME, "option") if option.get_attribute("value")]
-makes = [m for m in all_makes if m in target_brands]
-print("Target makes found:", makes)
+# Sharded mode (--workers N): N headless drivers in worker processes, each
+# crawling every N-th entry of target_brands. Cookie consent is given once
+# per driver and dropdowns are awaited with WebDriverWait, not sleeps.
+WAIT_TIMEOUT = 10
 
-engine_data = {}
 
-# --- Loop through target makes ---
-for make in makes:
-    time.sleep(1)
+def model_url(make, model):
+    return f"{WIKI_URL}make/{make.lower()}/model/{model.lower()}/"
 
-    # Visit main page again to refresh the make/model dropdown
-    driver.get("https://www.proxyparts.com/wiki/engine-codes/")
+
+# ------------------------
+# BROWSER: MAKES AND MODELS
+# ------------------------
+def make_driver(headless=False):
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    return webdriver.Chrome(options=options)
+
+
+def close_cookie_modal(driver, wait=None):
     try:
-        close_btn = driver.find_element(By.ID, "btCloseCookie")
-        close_btn.click()
-        time.sleep(0.5)
+        if wait:
+            close_btn = wait.until(EC.element_to_be_clickable((By.ID, "btCloseCookie")))
+            close_btn.click()
+            wait.until(EC.invisibility_of_element(close_btn))
+        else:
+            driver.find_element(By.ID, "btCloseCookie").click()
+            time.sleep(0.5)
     except:
         pass
 
+
+def discover_makes(driver, wait):
+    """Target makes offered by the make <select>"""
+    driver.get(WIKI_URL)
+    close_cookie_modal(driver, wait)
+
+    make_select = driver.find_element(By.ID, "objmake")
+    all_makes = [option.get_attribute("value") for option in make_select.find_elements(By.TAG_NAME, "option") if option.get_attribute("value")]
+    return [m for m in all_makes if m in target_brands]
+
+
+def discover_models(driver, make):
+    time.sleep(1)
+
+    # Visit main page again to refresh the make/model dropdown
+    driver.get(WIKI_URL)
+    close_cookie_modal(driver)
+
     # Select make in <select> to populate models
     make_select = driver.find_element(By.ID, "objmake")
     for option in make_select.find_elements(By.TAG_NAME, "option"):
@@ -55,14 +91,95 @@ for make in makes:
     time.sleep(2)  # Wait for models to populate
 
     model_select = driver.find_element(By.ID, "objmodel")
-    models = [option.get_attribute("value") for option in model_select.find_elements(By.TAG_NAME, "option") if option.get_attribute("value")]
+    return [option.get_attribute("value") for option in model_select.find_elements(By.TAG_NAME, "option") if option.get_attribute("value")]
 
-    print(f"{make} models:", models)
 
-    # --- Loop through models and scrape engine codes ---
+def model_options(driver, previous):
+    """#objmodel values once they are populated for the newly selected make"""
+    values = [option.get_attribute("value") for option in driver.find_elements(By.CSS_SELECTOR, "#objmodel option")]
+    values = [v for v in values if v]
+    return values if values and values != previous else False
+
+
+def select_models(driver, wait, make, previous=()):
+    """Select `make` on the already open landing page and wait for its models"""
+    Select(driver.find_element(By.ID, "objmake")).select_by_value(make)
+    return wait.until(lambda d: model_options(d, list(previous)))
+
+
+# ------------------------
+# MODEL PAGE PARSING
+# ------------------------
+def parse_model_page(html):
+    """Engine codes listed on one model page, in the engine_codes.json shape"""
+    page_soup = BeautifulSoup(html, "html.parser")
+    codes_div = page_soup.find("div", class_="codes")
+    if not codes_div:
+        return {}
+
+    result = {}
+    for code_header in codes_div.find_all("h2"):
+        engine_code = code_header.get("id")
+        table = code_header.find_next_sibling("table")
+        if not engine_code or not table:
+            continue
+        cars_list = []
+        for row in table.find_all("tr", class_="data"):
+            tds = row.find_all("td")
+            make_td = tds[0].get_text(strip=True)
+            year_td = tds[1]
+            year_rows = [div.span.get_text(strip=True) for div in year_td.find_all("div", class_="row")]
+            years_text = ", ".join([y for y in year_rows if y])
+            cars_list.append({
+                "category": make_td,
+                "group": make_td,
+                "model": make_td,
+                "years": years_text if years_text else "-"
+            })
+
+        result[engine_code.upper()] = {
+            "engine_info": {
+                "Enginecode": engine_code.upper(),
+                "Motortype": None,
+                "Cylinder": None,
+                "Valves": None,
+                "Cylindercapacity CCM": None,
+                "Horsepower (HP)": None
+            },
+            "cars": cars_list,
+            "tokens": {
+                "model": [c["model"].replace(" ","").lower() for c in cars_list],
+                "year": [c["years"] for c in cars_list],
+                "engine_type": None,
+                "engine_name": engine_code.lower()
+            }
+        }
+    return result
+
+
+def merge_codes(engine_data, result):
+    """
+    Add one model page's codes to engine_data. A code listed on several
+    model pages keeps a single entry with the cars of every page.
+    """
+    for code, entry in result.items():
+        if code not in engine_data:
+            engine_data[code] = entry
+            continue
+        merged = engine_data[code]
+        for car in entry["cars"]:
+            if car not in merged["cars"]:
+                merged["cars"].append(car)
+                merged["tokens"]["model"].append(car["model"].replace(" ","").lower())
+                merged["tokens"]["year"].append(car["years"])
+
+
+# ------------------------
+# MODEL PAGES: BROWSER OR HTTP
+# ------------------------
+def scrape_models_browser(driver, make, models, engine_data):
     for model in models:
-        url = f"https://www.proxyparts.com/wiki/engine-codes/make/{make.lower()}/model/{model.lower()}/"
-        driver.get(url)
+        driver.get(model_url(make, model))
         time.sleep(1)
 
         try:
@@ -71,55 +188,179 @@ for make in makes:
         except:
             pass
 
-        page_soup = BeautifulSoup(driver.page_source, "html.parser")
-        codes_div = page_soup.find("div", class_="codes")
-        if not codes_div:
-            continue
+        result = parse_model_page(driver.page_source)
+        merge_codes(engine_data, result)
+        print(f"{make} {model}: {len(result)} engine codes")
+
 
-        result = {}
-        for code_header in codes_div.find_all("h2"):
-            engine_code = code_header.get("id")
-            table = code_header.find_next_sibling("table")
-            if not table:
+class RateLimiter:
+    """Spaces request starts at least 1/rps seconds apart."""
+
+    def __init__(self, rps):
+        self.interval = 1 / rps
+        self.next_start = 0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def scrape_models_http(pages, engine_data, concurrency=HTTP_CONCURRENCY, rps=REQUESTS_PER_SECOND):
+    """
+    Fetch and parse the (make, model) pages concurrently. Results are
+    merged in `pages` order, so the output matches the browser crawl.
+    """
+    limiter = RateLimiter(rps)
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def fetch(client, make, model):
+        async with semaphore:
+            await limiter.wait()
+            r = await client.get(model_url(make, model))
+            r.raise_for_status()
+            return parse_model_page(r.text)
+
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30, follow_redirects=True) as client:
+        tasks = [asyncio.create_task(fetch(client, make, model)) for make, model in pages]
+        for (make, model), task in zip(pages, tasks):
+            try:
+                result = await task
+            except Exception as e:
+                print(f"{make} {model}: error: {e}")
                 continue
-            cars_list = []
-            for row in table.find_all("tr", class_="data"):
-                tds = row.find_all("td")
-                make_td = tds[0].get_text(strip=True)
-                year_td = tds[1]
-                year_rows = [div.span.get_text(strip=True) for div in year_td.find_all("div", class_="row")]
-                years_text = ", ".join([y for y in year_rows if y])
-                cars_list.append({
-                    "category": make_td,
-                    "group": make_td,
-                    "model": make_td,
-                    "years": years_text if years_text else "-"
-                })
-
-            result[engine_code.upper()] = {
-                "engine_info": {
-                    "Enginecode": engine_code.upper(),
-                    "Motortype": None,
-                    "Cylinder": None,
-                    "Valves": None,
-                    "Cylindercapacity CCM": None,
-                    "Horsepower (HP)": None
-                },
-                "cars": cars_list,
-                "tokens": {
-                    "model": [c["model"].replace(" ","").lower() for c in cars_list],
-                    "year": [c["years"] for c in cars_list],
-                    "engine_type": None,
-                    "engine_name": engine_code.lower()
-                }
-            }
-            print(result)
+            merge_codes(engine_data, result)
+            print(f"{make} {model}: {len(result)} engine codes")
+
+
+# ------------------------
+# SHARDED BROWSER POOL
+# ------------------------
+def crawl_shard(brands, use_http=False, headless=True):
+    """
+    One worker of the sharded crawl: a single driver walks `brands` on one
+    landing page load. Returns [(make, model, codes)] in crawl order;
+    codes is None when the model pages are left to the HTTP fetcher.
+    """
+    driver = make_driver(headless)
+    wait = WebDriverWait(driver, WAIT_TIMEOUT, ignored_exceptions=[StaleElementReferenceException])
+    try:
+        driver.get(WIKI_URL)
+        close_cookie_modal(driver, wait)
+        make_select = driver.find_element(By.ID, "objmake")
+        offered = {option.get_attribute("value") for option in make_select.find_elements(By.TAG_NAME, "option")}
+
+        pages = []
+        models = []
+        for make in brands:
+            if make not in offered:
+                continue
+            try:
+                models = select_models(driver, wait, make, models)
+            except TimeoutException:
+                print(f"{make}: no models listed")
+                continue
+            print(f"{make} models:", models)
+            pages.extend((make, model) for model in models)
+
+        results = []
+        for make, model in pages:
+            if use_http:
+                results.append((make, model, None))
+                continue
+            # driver.get returns once the page has loaded; the consent
+            # cookie keeps the modal from coming back
+            driver.get(model_url(make, model))
+            codes = parse_model_page(driver.page_source)
+            print(f"{make} {model}: {len(codes)} engine codes")
+            results.append((make, model, codes))
+        return results
+    finally:
+        driver.quit()
+
+
+def crawl_sharded(workers, use_http=False, concurrency=HTTP_CONCURRENCY, rps=REQUESTS_PER_SECOND, headless=True):
+    shards = [target_brands[i::workers] for i in range(workers) if target_brands[i::workers]]
+    with ProcessPoolExecutor(len(shards)) as pool:
+        shard_results = list(pool.map(crawl_shard, shards, [use_http] * len(shards), [headless] * len(shards)))
+
+    # merge in target_brands order, so the output does not depend on sharding
+    by_make = {}
+    for results in shard_results:
+        for make, model, codes in results:
+            by_make.setdefault(make, []).append((model, codes))
+
+    engine_data = {}
+    pages = []
+    for make in target_brands:
+        for model, codes in by_make.get(make, []):
+            if use_http:
+                pages.append((make, model))
+            else:
+                merge_codes(engine_data, codes)
+    if use_http:
+        asyncio.run(scrape_models_http(pages, engine_data, concurrency, rps))
+    return engine_data
+
+
+# ------------------------
+# MAIN SCRAPER
+# ------------------------
+def crawl_single(use_http=False, concurrency=HTTP_CONCURRENCY, rps=REQUESTS_PER_SECOND, headless=False):
+    driver = make_driver(headless)
+    wait = WebDriverWait(driver, 10)
+    engine_data = {}
+
+    try:
+        makes = discover_makes(driver, wait)
+        print("Target makes found:", makes)
+
+        pages = []
+        for make in makes:
+            models = discover_models(driver, make)
+            print(f"{make} models:", models)
+            if use_http:
+                pages.extend((make, model) for model in models)
+            else:
+                scrape_models_browser(driver, make, models, engine_data)
+    finally:
+        driver.quit()
+
+    if use_http:
+        asyncio.run(scrape_models_http(pages, engine_data, concurrency, rps))
+    return engine_data
+
+
+def run(use_http=False, concurrency=HTTP_CONCURRENCY, rps=REQUESTS_PER_SECOND, workers=0):
+    if workers:
+        engine_data = crawl_sharded(workers, use_http, concurrency, rps)
+    else:
+        engine_data = crawl_single(use_http, concurrency, rps)
+
+    # --- Save to JSON ---
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        json.dump(engine_data, f, indent=4, ensure_ascii=False)
+
+    print("Done! Total engine codes:", len(engine_data))
+    return engine_data
 
 
-driver.quit()
+def option(name, default):
+    if name in sys.argv:
+        return type(default)(sys.argv[sys.argv.index(name) + 1])
+    return default
 
-# --- Save to JSON ---
-with open("engine_codes.json", "w", encoding="utf-8") as f:
-    json.dump(engine_data, f, indent=4, ensure_ascii=False)
 
-print("Done! Total engine codes:", len(engine_data))
+if __name__ == "__main__":
+    # python main.py [--http] [--concurrency 8] [--rps 4] [--workers N]
+    run(
+        use_http="--http" in sys.argv,
+        concurrency=option("--concurrency", HTTP_CONCURRENCY),
+        rps=option("--rps", REQUESTS_PER_SECOND),
+        workers=option("--workers", 0)
+    )
@@ -0,0 +1,299 @@
+import contextlib
+import io
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+# -----------------------------------------------
+# SEARCH BENCHMARK / ACCURACY SUITE
+#
+# Builds "brand | model | type | engine" queries from the DVX corpus
+# (apply-rule/engines.json), runs them through the search engine and
+# reports latency percentiles, throughput, memory and top-1/top-5
+# accuracy on the queries whose engine code is known: engineCode when it
+# is set, otherwise a database code written in parentheses in the engine
+# name ("1.4 TSi (CAVE) 180 PK"). Accuracy is also reported per label
+# source: the search's exact-code fast path reads those same parenthesized
+# codes, so only engineCode (and --labels) labels measure it independently;
+# --no-code-fast-path turns the fast path off for a like-for-like run. Each
+# run is stored as JSON under RESULTS_DIR; --compare prints the change
+# against an earlier run.
+#
+#   cd project/src/database
+#   python bench_search.py [--mode matrix|bounded|ngram] [--limit N] [--top-n 5]
+#                          [--ngram-k 200] [--grow N] [--no-code-fast-path] [--reload]
+#                          [--labels extra.json] [--compare bench_results/<run>.json]
+#
+# extra.json: [{"query": "vw | golf | ... ", "expected": ["CAVE"]}, ...]
+#
+# --grow N indexes N copies of every engine_codes.json entry (codes
+# suffixed with GROW_SEPARATOR and the copy number) to see how latency
+# scales with the database.
+#
+# --reload runs the queries a second time against the live index while
+# reload_databases rebuilds it on a background thread, as POST
+# /admin/reload does, RELOAD_PAUSE seconds apart, and compares latency
+# of the queries that overlapped a rebuild with the ones that did not.
+# -----------------------------------------------
+
+ENGINES_FILE = "../apply-rule/engines.json"
+RESULTS_DIR = "bench_results"
+WARMUP_QUERIES = 20
+GROW_SEPARATOR = "~"
+GROWN_FILE = "engine_codes.json"
+RELOAD_PAUSE = 0.5
+
+
+def normalize_code(code):
+    return re.sub(r"[\s\-]+", "", str(code).upper())
+
+
+def labelled_codes(engine, known_codes):
+    codes = []
+    if engine.get("engineCode") and engine["engineCode"] != "UNKNOWN":
+        codes.append(normalize_code(engine["engineCode"]))
+    for group in re.findall(r"\(([^)]*)\)", engine.get("engineName") or ""):
+        for token in re.split(r"[,/]", group):
+            code = normalize_code(token)
+            if code in known_codes and code not in codes:
+                codes.append(code)
+    return codes
+
+
+def build_queries(engines, known_codes):
+    """
+    One query per distinct text; expected codes of duplicates are merged.
+    source: "engineCode" when any label is an engineCode, else "engineName".
+    """
+    queries = {}
+    for engine in engines:
+        text = " | ".join(engine.get(f) or "" for f in ("brandName", "modelName", "typeName", "engineName"))
+        q = queries.setdefault(text, {"query": text, "expected": [], "source": "engineName"})
+        q["expected"].extend(c for c in labelled_codes(engine, known_codes) if c not in q["expected"])
+        if engine.get("engineCode") and engine["engineCode"] != "UNKNOWN":
+            q["source"] = "engineCode"
+    return list(queries.values())
+
+
+def search_fn(se, mode, ngram_k):
+    if mode == "bounded":
+        return lambda query, index, top_n: se.search_bounded(query, index, top_n)[0]
+    if mode == "ngram":
+        return lambda query, index, top_n: se.search_ngram(query, index, top_n, ngram_k)[0]
+    return se.search_three_step
+
+
+def grown_index(se, factor):
+    named_dicts = []
+    for file in se.DB_FILES:
+        with open(f"{se.DATA_DIR}/{file}", "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if file == GROWN_FILE and factor > 1:
+            data = {f"{code}{GROW_SEPARATOR}{i}" if i else code: entry
+                    for i in range(factor) for code, entry in data.items()}
+        named_dicts.append((file, data))
+    return se.build_search_index(se.rows_from_engine_dicts(named_dicts), f"grow{factor}")
+
+
+def run_queries(search, queries, index, top_n):
+    for q in queries[:WARMUP_QUERIES]:
+        search(q["query"], index, top_n)
+
+    latencies = []
+    results = []
+    for q in queries:
+        start = time.perf_counter()
+        found = search(q["query"], index, top_n)
+        latencies.append(time.perf_counter() - start)
+        results.append([normalize_code(r["engine_code"].split(GROW_SEPARATOR)[0]) for r in found])
+    return np.array(latencies), results
+
+
+def run_during_reloads(se, search, queries, top_n):
+    # Every query reads se.search_index, like the endpoints, so it sees
+    # the reference swap; reloads are logged as (start, end) intervals.
+    reloads = []
+    stop = threading.Event()
+
+    def reloader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            se.reload_databases()
+            reloads.append((start, time.perf_counter()))
+            stop.wait(RELOAD_PAUSE)
+
+    spans = []
+    thread = threading.Thread(target=reloader)
+    with contextlib.redirect_stdout(io.StringIO()):  # one line per reload
+        thread.start()
+        for q in queries:
+            start = time.perf_counter()
+            search(q["query"], se.search_index, top_n)
+            spans.append((start, time.perf_counter()))
+        stop.set()
+        thread.join()
+
+    spans = np.array(spans)
+    overlapped = np.zeros(len(spans), dtype=bool)
+    for start, end in reloads:
+        overlapped |= (spans[:, 0] < end) & (spans[:, 1] > start)
+    ms = (spans[:, 1] - spans[:, 0]) * 1000
+
+    def percentiles(sample):
+        if not len(sample):
+            return None
+        return {key: float(np.percentile(sample, q)) for key, q in (("p50", 50), ("p95", 95), ("p99", 99))}
+
+    return {
+        "reloads": len(reloads),
+        "reload_s": float(np.mean([end - start for start, end in reloads])) if reloads else None,
+        "queries_during": int(overlapped.sum()),
+        "during_ms": percentiles(ms[overlapped]),
+        "between_ms": percentiles(ms[~overlapped])
+    }
+
+
+def traced_peak(search, queries, index, top_n):
+    # separate pass: tracemalloc slows allocation down too much to time under
+    tracemalloc.start()
+    for q in queries:
+        search(q["query"], index, top_n)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def hit_rates(labelled):
+    top1 = sum(bool(r) and r[0] in q["expected"] for q, r in labelled)
+    top5 = sum(any(code in q["expected"] for code in r[:5]) for q, r in labelled)
+    n = len(labelled) or 1
+    return {"labelled": len(labelled), "top1": top1 / n, "top5": top5 / n}
+
+
+def accuracy(queries, results):
+    labelled = [(q, r) for q, r in zip(queries, results) if q["expected"]]
+    misses = [{"query": q["query"], "expected": q["expected"], "got": r[:5]}
+              for q, r in labelled if not any(code in q["expected"] for code in r[:5])]
+    scores = hit_rates(labelled)
+    sources = sorted({q["source"] for q, _ in labelled})
+    scores["by_source"] = {src: hit_rates([(q, r) for q, r in labelled if q["source"] == src]) for src in sources}
+    return scores, misses
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, previous):
+    print(f"\nvs {previous.get('commit')} ({previous.get('timestamp')}):")
+    for key in ("p50", "p95", "p99"):
+        old, new = previous["latency_ms"][key], report["latency_ms"][key]
+        print(f"  {key:<8} {old:8.3f} -> {new:8.3f} ms ({(new - old) / old * 100:+.1f}%)")
+    print(f"  {'qps':<8} {previous['qps']:8.1f} -> {report['qps']:8.1f}")
+    for key in ("top1", "top5"):
+        print(f"  {key:<8} {previous['accuracy'][key]:8.3f} -> {report['accuracy'][key]:8.3f}")
+
+
+def option(name, default):
+    if name in sys.argv:
+        return type(default)(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
+def main():
+    mode = option("--mode", "matrix")
+    top_n = option("--top-n", 5)
+    limit = option("--limit", 0)
+    grow = option("--grow", 1)
+
+    start = time.perf_counter()
+    import search_engine as se
+    ngram_k = option("--ngram-k", se.NGRAM_TOP_K)
+    se.CODE_FAST_PATH = "--no-code-fast-path" not in sys.argv
+    index = se.load_search_index() if grow == 1 else grown_index(se, grow)
+    load_s = time.perf_counter() - start
+
+    known_codes = {normalize_code(code) for code in index["rows"]["code"]}
+    with open(ENGINES_FILE, "r", encoding="utf-8") as f:
+        queries = build_queries(json.load(f)["engineData"], known_codes)
+    if "--labels" in sys.argv:
+        with open(option("--labels", ""), "r", encoding="utf-8") as f:
+            queries += [{"query": q["query"], "expected": [normalize_code(c) for c in q["expected"]], "source": "labels"}
+                        for q in json.load(f)]
+    if limit:
+        queries = queries[:limit]
+
+    search = search_fn(se, mode, ngram_k)
+    latencies, results = run_queries(search, queries, index, top_n)
+    peak_traced = traced_peak(search, queries, index, top_n)
+    scores, misses = accuracy(queries, results)
+    # reloads rebuild the unmodified index, so not with --grow
+    reload = run_during_reloads(se, search, queries, top_n) if "--reload" in sys.argv and grow == 1 else None
+
+    ms = latencies * 1000
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "dataset_version": index["version"],
+        "mode": mode,
+        "top_n": top_n,
+        "ngram_k": ngram_k if mode == "ngram" else None,
+        "code_fast_path": se.CODE_FAST_PATH,
+        "grow": grow,
+        "index_rows": len(index["rows"]["code"]),
+        "queries": len(queries),
+        "index_load_s": round(load_s, 3),
+        "latency_ms": {
+            "p50": float(np.percentile(ms, 50)),
+            "p95": float(np.percentile(ms, 95)),
+            "p99": float(np.percentile(ms, 99)),
+            "mean": float(ms.mean()),
+            "max": float(ms.max())
+        },
+        "qps": len(queries) / float(latencies.sum()),
+        # ru_maxrss is KiB on Linux: the whole process, index included
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_search_alloc_mb": peak_traced / 2**20,
+        "reload": reload,
+        "accuracy": scores,
+        "misses": misses
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{mode}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    lat = report["latency_ms"]
+    print(f"{len(queries)} queries ({mode}) over {report['index_rows']} entries, index load {load_s:.2f} s")
+    print(f"latency p50 {lat['p50']:.3f} ms  p95 {lat['p95']:.3f} ms  p99 {lat['p99']:.3f} ms  |  {report['qps']:.1f} q/s")
+    if reload:
+        during, between = reload["during_ms"], reload["between_ms"]
+        print(f"during {reload['reloads']} reloads ({reload['reload_s']:.2f} s each, {reload['queries_during']} queries): "
+              + (f"p50 {during['p50']:.3f} ms  p95 {during['p95']:.3f} ms  p99 {during['p99']:.3f} ms" if during else "no queries"))
+        if between:
+            print(f"between reloads: p50 {between['p50']:.3f} ms  p95 {between['p95']:.3f} ms  p99 {between['p99']:.3f} ms")
+    print(f"memory peak RSS {report['peak_rss_mb']:.1f} MiB, search allocations {report['peak_search_alloc_mb']:.1f} MiB")
+    print(f"accuracy on {scores['labelled']} labelled: top-1 {scores['top1']:.3f}  top-5 {scores['top5']:.3f}")
+    for src, s in scores["by_source"].items():
+        print(f"  {src + ' labels':<18} {s['labelled']:5d}: top-1 {s['top1']:.3f}  top-5 {s['top5']:.3f}")
+    print("Saved", out)
+
+    if "--compare" in sys.argv:
+        with open(option("--compare", ""), "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+import numpy as np
+
+# -----------------------------------------------
+# COMPILED ENGINE SNAPSHOT
+#
+# One file holding the rows of every engine database:
+#
+#   MAGIC | u64 header length | JSON header | 8-byte aligned columns
+#
+# Scoring fields are columnar so the search engine can load them with a
+# single mmap: numeric columns are read zero-copy, string columns are one
+# NUL-joined UTF-8 run each. engine_info/cars live in an offset-indexed
+# JSON blob that is only decoded for returned results. The header records
+# the SHA-1 of every source JSON file, so readers can tell whether the
+# snapshot still holds the same data as the JSON next to it.
+# -----------------------------------------------
+
+MAGIC = b"DVXSNAP2"
+ALIGN = 8
+
+# Raw per-row columns shared by the JSON and snapshot loaders
+STRING_COLUMNS = ["code", "category", "engine_type", "engine_name", "hp", "model", "chassis", "year"]
+ARRAY_COLUMNS = ["db", "category_starts", "model_starts", "chassis_starts", "year_starts"]
+
+
+class BlobColumn:
+    """Read-only list of JSON documents decoded on access."""
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return json.loads(bytes(self.buffer[start:end]))
+
+
+def rows_from_engine_dicts(named_dicts):
+    """
+    Flatten [(file_name, engine_dict), ...] into raw row columns.
+    Multi-valued token fields are flat lists plus per-row start offsets;
+    so are the distinct car categories (an entry merged from several
+    files can cover several brands).
+    """
+    table = {name: [] for name in STRING_COLUMNS + ARRAY_COLUMNS}
+    table["description"] = []
+
+    for db, (_, data) in enumerate(named_dicts):
+        for code, entry in data.items():
+            tokens = entry["tokens"]
+            categories = dict.fromkeys(car.get("category") or "" for car in entry.get("cars") or [{}])
+            table["code"].append(code)
+            table["db"].append(db)
+            table["category_starts"].append(len(table["category"]))
+            table["category"].extend(categories)
+            table["engine_type"].append(tokens.get("engine_type") or "")
+            table["engine_name"].append(tokens.get("engine_name", ""))
+            table["hp"].append(str((tokens.get("engine_info") or {}).get("Horsepower (HP)") or ""))
+            for field in ("model", "chassis", "year"):
+                table[f"{field}_starts"].append(len(table[field]))
+                table[field].extend(tokens.get(field) or [])
+            table["description"].append(entry)
+
+    table["db"] = np.array(table["db"], dtype=np.uint8)
+    for field in ("category", "model", "chassis", "year"):
+        table[f"{field}_starts"] = np.array(table[f"{field}_starts"], dtype=np.int64)
+    table["db_files"] = [name for name, _ in named_dicts]
+    return table
+
+
+def source_hashes(paths):
+    """{file name: SHA-1 of its content} of the source JSON files"""
+    hashes = {}
+    for path in paths:
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        hashes[os.path.basename(path)] = digest.hexdigest()
+    return hashes
+
+
+def write_snapshot(path, table, sources=None):
+    chunks = []
+    columns = {}
+    offset = 0
+
+    def add(name, kind, payload, **meta):
+        nonlocal offset
+        pad = -offset % ALIGN
+        chunks.append(b"\0" * pad)
+        offset += pad
+        columns[name] = {"kind": kind, "offset": offset, "size": len(payload), **meta}
+        chunks.append(payload)
+        offset += len(payload)
+
+    for name in STRING_COLUMNS:
+        add(name, "strings", "\0".join(table[name]).encode("utf-8"), count=len(table[name]))
+    for name in ARRAY_COLUMNS:
+        arr = np.ascontiguousarray(table[name])
+        add(name, "array", arr.tobytes(), dtype=arr.dtype.str, count=len(arr))
+
+    blobs = [
+        json.dumps({"engine_info": d["engine_info"], "cars": d["cars"]}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        for d in table["description"]
+    ]
+    blob_offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in blobs], out=blob_offsets[1:])
+    add("description_offsets", "array", blob_offsets.tobytes(), dtype=blob_offsets.dtype.str, count=len(blob_offsets))
+    add("description", "blob", b"".join(blobs))
+
+    header = json.dumps({"rows": len(table["code"]), "db_files": table["db_files"], "sources": sources or {},
+                         "columns": columns}).encode("utf-8")
+    prefix = MAGIC + struct.pack("<Q", len(header)) + header
+    prefix += b"\0" * (-len(prefix) % ALIGN)
+
+    with open(path, "wb") as f:
+        f.write(prefix)
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def read_header(mm, path):
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not an engine snapshot")
+    (header_len,) = struct.unpack_from("<Q", mm, len(MAGIC))
+    start = len(MAGIC) + 8
+    header = json.loads(mm[start:start + header_len])
+    return header, start + header_len + (-(start + header_len) % ALIGN)
+
+
+def read_snapshot_header(path):
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return read_header(mm, path)[0]
+
+
+def read_snapshot(path):
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header, base = read_header(mm, path)
+
+    table = {"db_files": header["db_files"], "sources": header.get("sources", {}), "mmap": mm}
+    view = memoryview(mm)
+    for name, col in header["columns"].items():
+        offset = base + col["offset"]
+        if col["kind"] == "array":
+            table[name] = np.frombuffer(mm, dtype=col["dtype"], count=col["count"], offset=offset)
+        elif col["kind"] == "strings":
+            text = view[offset:offset + col["size"]].tobytes().decode("utf-8")
+            table[name] = text.split("\0") if col["count"] else []
+        else:
+            table[name] = view[offset:offset + col["size"]]
+    table["description"] = BlobColumn(table["description"], table.pop("description_offsets"))
+    return table
+
+
+def compile_snapshot(path, json_files):
+    named_dicts = []
+    for file in json_files:
+        with open(file, "r", encoding="utf-8") as f:
+            named_dicts.append((file.replace("\\", "/").split("/")[-1], json.load(f)))
+    table = rows_from_engine_dicts(named_dicts)
+    write_snapshot(path, table, source_hashes(json_files))
+    return len(table["code"])
+
+
+if __name__ == "__main__":
+    # python engine_snapshot.py database/engine_index.snap database/engine_data.json database/engine_codes.json
+    if len(sys.argv) < 3:
+        print("Usage: engine_snapshot.py OUTPUT INPUT.json [INPUT.json ...]")
+        sys.exit(1)
+    rows = compile_snapshot(sys.argv[1], sys.argv[2:])
+    print(f"Saved engine snapshot: {rows} rows -> {sys.argv[1]}")
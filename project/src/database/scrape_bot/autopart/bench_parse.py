@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import time
+
+from main import CACHE_DIR, parse_engine_page
+
+# ------------------------
+# PARSER BENCHMARK
+#
+# python bench_parse.py [CORPUS_DIR] [--repeat N]
+#
+# Parses every saved engine page (*.html, e.g. the scraper's response
+# cache) with the full-tree and the region-only parsers, checks that each
+# produces byte-identical output to the original full html.parser path,
+# and reports pages per second.
+# ------------------------
+
+VARIANTS = [
+    ("full html.parser", "html.parser", False),
+    ("fast html.parser", "html.parser", True),
+    ("full lxml", "lxml", False),
+    ("fast lxml", "lxml", True)
+]
+
+
+def load_corpus(directory):
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".html"):
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                pages.append(f.read())
+    return pages
+
+
+def dump(result):
+    return json.dumps(result, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def parse_all(pages, parser, fast):
+    out = []
+    for html in pages:
+        try:
+            out.append(dump(parse_engine_page(html, parser=parser, fast=fast)))
+        except Exception as e:
+            out.append(f"error: {type(e).__name__}".encode("utf-8"))
+    return out
+
+
+def bench(pages, repeat=3):
+    reference = parse_all(pages, "html.parser", False)
+    report = []
+    for label, parser, fast in VARIANTS:
+        try:
+            parse_engine_page(pages[0], parser=parser, fast=fast)
+        except Exception as e:
+            if "FeatureNotFound" in type(e).__name__:
+                print(f"{label:18} skipped (parser not installed)")
+                continue
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = parse_all(pages, parser, fast)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        identical = output == reference
+        report.append({"parser": label, "pages_per_sec": len(pages) / best, "identical": identical})
+        print(f"{label:18} {len(pages) / best:9.1f} pages/s   identical: {identical}")
+    return report
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    repeat = 3
+    if "--repeat" in args:
+        i = args.index("--repeat")
+        repeat = int(args[i + 1])
+        del args[i:i + 2]
+    corpus_dir = args[0] if args else CACHE_DIR
+    pages = load_corpus(corpus_dir)
+    if not pages:
+        print(f"No saved pages (*.html) in {corpus_dir}")
+        sys.exit(1)
+    print(f"Corpus: {len(pages)} pages from {corpus_dir}")
+    bench(pages, repeat)
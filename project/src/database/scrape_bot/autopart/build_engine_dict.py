@@ -1,10 +1,29 @@
 import os
+import sys
 import json
 import re
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
 INPUT_DIR = "../ma"
 OUTPUT_FILE = "engine_data.json"
 
+# Incremental rebuilds: per input file, the content hash and the codes it
+# contributed. Only files whose hash changed are re-read. Bump
+# BUILD_FORMAT when the normalization or merge rule below changes.
+MANIFEST_FILE = "engine_data.manifest.json"
+BUILD_FORMAT = 2
+
+# Full builds parse and tokenize the input files in a process pool
+# (--workers N); results are merged in file order, so the output does not
+# depend on which worker finishes first
+BUILD_WORKERS = os.cpu_count() or 1
+
+# --snapshot: also compile engine_data + engine_codes into the search
+# engine's binary snapshot (see project/src/database/engine_snapshot.py)
+DATABASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+ENGINE_CODES_FILE = os.path.join(DATABASE_DIR, "database", "engine_codes.json")
+
 
 def normalize(s):
     """Lowercase, remove extra spaces/dashes"""
@@ -25,61 +44,285 @@ def expand_chassis(chassis_str):
     return re.escape(chassis_str.lower())
 
 
-def build_engine_dict(directory):
-    engine_dict = {}
+def iter_ndjson(path):
+    """Scraped pages of a *.ndjson stream, read one line at a time"""
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                print(f"Invalid JSON in {os.path.basename(path)} line {number}: {e}")
+
+
+def read_items(path):
+    """Scraped pages of one file: an NDJSON stream or a legacy JSON array"""
+    if path.endswith(".ndjson"):
+        return iter_ndjson(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-    for filename in os.listdir(directory):
-        if not filename.endswith(".json"):
+
+def input_files(directory):
+    """Scraper output files of `directory`, in the order they are merged"""
+    filenames = os.listdir(directory)
+    files = []
+    for filename in sorted(filenames):
+        if not filename.endswith((".json", ".ndjson")):
+            continue
+        # {brand}_engines.json is compacted from the stream next to it
+        if filename.endswith(".json") and filename[:-5] + ".ndjson" in filenames:
             continue
+        files.append(filename)
+    return files
+
+
+def engine_entry(item):
+    """(code, engine_dict entry) for one scraped page, or None without a code"""
+    engine_info = item.get("engine_info", {})
+    cars = item.get("cars", [])
+    code = engine_info.get("Enginecode")
+    if not code:
+        return None
+
+    return code.strip(), make_entry(engine_info, cars)
+
+
+def make_entry(engine_info, cars):
+    engine_type = engine_info.get("Motortype", "").strip()
+    engine_name = engine_info.get("Enginecode", "").strip()
+
+    # Extract models, years, and chassis patterns
+    models = [c.get("model", "").strip() for c in cars if c.get("model")]
+    years = [c.get("years", "").strip() for c in cars if c.get("years")]
+    chassis_patterns = [expand_chassis(c.get("group", "")) for c in cars if c.get("group")]
+
+    # Store normalized tokens for search
+    tokens = {
+        "model": list(dict.fromkeys(normalize(m) for m in models)),
+        "year": years,
+        "engine_type": normalize(engine_type),
+        "engine_name": normalize(engine_name),
+        "chassis": chassis_patterns
+    }
+
+    return {
+        "engine_info": engine_info,
+        "cars": cars,
+        "tokens": tokens
+    }
+
+
+def info_richness(engine_info):
+    return sum(1 for value in engine_info.values() if value not in (None, "", [], {}))
+
+
+def merge_entry(entry, other):
+    """
+    One entry for a code found twice (`entry` from the earlier file or
+    page): the cars lists are unioned in order, and the engine_info with
+    more filled-in fields wins, the earlier one on a tie.
+    """
+    cars = list(entry["cars"])
+    seen = {json.dumps(car, sort_keys=True) for car in cars}
+    for car in other["cars"]:
+        key = json.dumps(car, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            cars.append(car)
+    engine_info = entry["engine_info"]
+    if info_richness(other["engine_info"]) > info_richness(engine_info):
+        engine_info = other["engine_info"]
+    return make_entry(engine_info, cars)
+
+
+def merge_into(engine_dict, entries):
+    for code, entry in entries.items():
+        engine_dict[code] = merge_entry(engine_dict[code], entry) if code in engine_dict else entry
+
+
+def parse_file(path):
+    """Entries contributed by one input file"""
+    entries = {}
+    try:
+        data = read_items(path)
+    except Exception as e:
+        print(f"Invalid JSON in {os.path.basename(path)}: {e}")
+        return entries
+
+    for item in data:
+        entry = engine_entry(item)
+        if entry:
+            merge_into(entries, dict([entry]))
+    return entries
 
+
+def read_input(path):
+    return file_hash(path), parse_file(path)
+
+
+def build_engine_dict(directory, files=None, workers=BUILD_WORKERS):
+    """Full build; fills `files` with manifest entries when it is given"""
+    filenames = input_files(directory)
+    paths = [os.path.join(directory, filename) for filename in filenames]
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(min(workers, len(paths))) as pool:
+            results = list(pool.map(read_input, paths))
+    else:
+        results = [read_input(path) for path in paths]
+
+    engine_dict = {}
+    for filename, (digest, entries) in zip(filenames, results):
+        merge_into(engine_dict, entries)
+        if files is not None:
+            files[filename] = {"sha1": digest, "codes": list(entries)}
+    return engine_dict
+
+
+# ------------------------
+# INCREMENTAL REBUILD
+# ------------------------
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(path, output_file):
+    """Manifest of the previous build, or None when it does not describe output_file"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != BUILD_FORMAT:
+        return None
+    if not os.path.exists(output_file) or manifest.get("output_sha1") != file_hash(output_file):
+        return None
+    return manifest
+
+
+def save_manifest(path, files, output_file):
+    manifest = {"format": BUILD_FORMAT, "files": files, "output_sha1": file_hash(output_file)}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def rebuild_engine_dict(directory, engine_dict, manifest):
+    """
+    Bring engine_dict (the previous output) up to date with `directory`,
+    re-reading only the files whose content hash differs from `manifest`.
+    Codes of changed or removed files are dropped and re-merged from every
+    file that still contributes them, so the result matches a full build.
+    Returns (engine_dict, manifest files, diff).
+    """
+    old_files = manifest["files"]
+    filenames = input_files(directory)
+    files = {}
+    parsed = {}
+    changed_files = []
+    affected = set()
+
+    for filename in filenames:
         path = os.path.join(directory, filename)
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"Invalid JSON in {filename}: {e}")
+        digest = file_hash(path)
+        old = old_files.get(filename)
+        if old and old["sha1"] == digest:
+            files[filename] = old
             continue
+        parsed[filename] = parse_file(path)
+        changed_files.append(filename)
+        files[filename] = {"sha1": digest, "codes": list(parsed[filename])}
+        affected.update(parsed[filename])
+        if old:
+            affected.update(old["codes"])
+    removed_files = [filename for filename in old_files if filename not in files]
+    for filename in removed_files:
+        affected.update(old_files[filename]["codes"])
 
-        for item in data:
-            engine_info = item.get("engine_info", {})
-            cars = item.get("cars", [])
-            code = engine_info.get("Enginecode")
-            if not code:
+    # unchanged files sharing an affected code are read again for its entry
+    merged = {}
+    for filename in filenames:
+        if filename not in parsed:
+            if affected.isdisjoint(files[filename]["codes"]):
                 continue
+            parsed[filename] = parse_file(os.path.join(directory, filename))
+        merge_into(merged, {code: entry for code, entry in parsed[filename].items() if code in affected})
 
-            code = code.strip()
-            engine_type = engine_info.get("Motortype", "").strip()
-            engine_name = engine_info.get("Enginecode", "").strip()
-
-            # Extract models, years, and chassis patterns
-            models = [c.get("model", "").strip() for c in cars if c.get("model")]
-            years = [c.get("years", "").strip() for c in cars if c.get("years")]
-            chassis_patterns = [expand_chassis(c.get("group", "")) for c in cars if c.get("group")]
-
-            # Store normalized tokens for search
-            tokens = {
-                "model": [normalize(m) for m in models],
-                "year": years,
-                "engine_type": normalize(engine_type),
-                "engine_name": normalize(engine_name),
-                "chassis": chassis_patterns
-            }
-
-            engine_dict[code] = {
-                "engine_info": engine_info,
-                "cars": cars,
-                "tokens": tokens
-            }
+    diff = {"added": [], "removed": [], "changed": [], "files_read": len(parsed),
+            "files_changed": changed_files, "files_removed": removed_files}
+    for code in sorted(affected):
+        if code not in merged:
+            if code in engine_dict:
+                diff["removed"].append(code)
+        elif code not in engine_dict:
+            diff["added"].append(code)
+        elif merged[code] != engine_dict[code]:
+            diff["changed"].append(code)
 
-    return engine_dict
+    # same key order as a full build: first appearance in file order
+    rebuilt = {}
+    for filename in filenames:
+        for code in files[filename]["codes"]:
+            if code not in rebuilt:
+                rebuilt[code] = merged[code] if code in affected else engine_dict[code]
+    return rebuilt, files, diff
+
+
+def print_diff(diff):
+    print(f"Re-read {diff['files_read']} file(s): {len(diff['files_changed'])} changed, "
+          f"{len(diff['files_removed'])} removed.")
+    for kind, sign in (("added", "+"), ("removed", "-"), ("changed", "~")):
+        codes = diff[kind]
+        if codes:
+            shown = ", ".join(codes[:10]) + (f", ... ({len(codes) - 10} more)" if len(codes) > 10 else "")
+            print(f"  {sign}{len(codes)} {kind}: {shown}")
+
+
+def write_snapshot(path):
+    """
+    Compile the search snapshot from the engine_data.json just written plus
+    engine_codes.json. The snapshot records their content hashes, and the
+    search engine only uses it while its database/ JSON files match them,
+    so copy OUTPUT_FILE there along with the snapshot.
+    """
+    sys.path.insert(0, DATABASE_DIR)
+    from engine_snapshot import compile_snapshot
+
+    rows = compile_snapshot(path, [OUTPUT_FILE, ENGINE_CODES_FILE])
+    print(f"Saved engine snapshot: {rows} rows -> {path}")
 
 
 def main():
-    engine_dict = build_engine_dict(INPUT_DIR)
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(engine_dict, f, indent=4, ensure_ascii=False)
+    manifest = None if "--full" in sys.argv else load_manifest(MANIFEST_FILE, OUTPUT_FILE)
+    if manifest:
+        with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
+            engine_dict = json.load(f)
+        rebuilt, files, diff = rebuild_engine_dict(INPUT_DIR, engine_dict, manifest)
+        print_diff(diff)
+        # a new file can move codes earlier without changing any entry
+        dirty = diff["added"] or diff["removed"] or diff["changed"] or list(rebuilt) != list(engine_dict)
+        engine_dict = rebuilt
+    else:
+        files = {}
+        workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else BUILD_WORKERS
+        engine_dict = build_engine_dict(INPUT_DIR, files, workers)
+        dirty = True
+
+    if dirty:
+        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+            json.dump(engine_dict, f, indent=4, ensure_ascii=False)
+    save_manifest(MANIFEST_FILE, files, OUTPUT_FILE)
     print(f"Saved engine dictionary: {len(engine_dict)} entries.")
 
+    if "--snapshot" in sys.argv:
+        write_snapshot(sys.argv[sys.argv.index("--snapshot") + 1])
+
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,10 @@
+import asyncio
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import httpx
+import os
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import json
 import time
 import sys
@@ -10,17 +15,57 @@ headers = {
     "User-Agent": "Mozilla/5.0 (Python scraper)"
 }
 
+# Async fetch mode (--async): parallel requests over one keep-alive pool,
+# paced by a token bucket instead of a fixed sleep between pages
+ASYNC_CONCURRENCY = 8
+REQUESTS_PER_SECOND = 2.0
+
+# Pipeline mode (--pipeline): fetchers feed raw pages through a bounded
+# queue to parse_engine_page running in a process pool
+PARSE_WORKERS = os.cpu_count() or 2
+PIPELINE_QUEUE_SIZE = 32
+
+# On-disk response cache: pages younger than CACHE_MAX_AGE seconds are not
+# re-fetched, older ones are revalidated with ETag/Last-Modified
+CACHE_DIR = ".http_cache"
+CACHE_MAX_AGE = 7 * 24 * 3600
+
+# Output: records are streamed to {arg}_engines.ndjson as pages complete
+# and flushed every NDJSON_FLUSH_EVERY records; the legacy indent=2 array
+# {arg}_engines.json is compacted from it at the end (--no-compact skips it)
+NDJSON_FLUSH_EVERY = 20
+
+# Fast parse: only the engine content box is built into a tree (plus
+# table#models if it is not inside that box); the rest of the page is
+# skipped. PARSER may be "lxml" when it is installed (see bench_parse.py).
+ENGINE_CONTENT_CLASS = "-m-ph-small -m-pv-small box--m-w100p"
+PARSER = "html.parser"
+FAST_PARSE = True
+
 # ------------------------
 # SCRAPE SINGLE ENGINE PAGE
 # ------------------------
 def scrape_engine_page(url):
     print("Scraping engine:", url)
     r = requests.get(url, headers=headers)
-    soup = BeautifulSoup(r.text, "html.parser")
+    result = parse_engine_page(r.text)
+    print(result["engine_info"])
+    print(result)
+    return result
+
+
+def parse_engine_page(html, parser=PARSER, fast=FAST_PARSE):
+    if fast:
+        soup = BeautifulSoup(html, parser, parse_only=SoupStrainer("div", class_=ENGINE_CONTENT_CLASS))
+        models_soup = soup
+        if not soup.find("table", id="models"):
+            models_soup = BeautifulSoup(html, parser, parse_only=SoupStrainer("table", id="models"))
+    else:
+        soup = models_soup = BeautifulSoup(html, parser)
 
     data = {}
 
-    content = soup.find("div", class_="-m-ph-small -m-pv-small box--m-w100p")
+    content = soup.find("div", class_=ENGINE_CONTENT_CLASS)
     # print(content)
 
     # ----------------------------
@@ -34,12 +79,11 @@ def scrape_engine_page(url):
         val = cols[i+1].get_text(strip=True)
 
         engine_info[key] = val
-    print(engine_info)
     # ----------------------------
     # 2) PARSE CARS / COMPATIBILITY
     # ----------------------------
        
-    models_table = soup.find("table", id="models")
+    models_table = models_soup.find("table", id="models")
     models = []
 
     current_category = None
@@ -88,10 +132,304 @@ def scrape_engine_page(url):
         "engine_info": engine_info,
         "cars": models
     }
-    print(result)
     return result
 
 
+# ------------------------
+# RESPONSE CACHE / CHECKPOINT
+# ------------------------
+class ResponseCache:
+    """Per-URL page cache: <sha1>.html body plus <sha1>.json metadata."""
+
+    def __init__(self, directory=CACHE_DIR, max_age=CACHE_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        key = os.path.join(self.directory, hashlib.sha1(url.encode("utf-8")).hexdigest())
+        return key + ".html", key + ".json"
+
+    def get(self, url):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            with open(body_path, "r", encoding="utf-8") as f:
+                entry["body"] = f.read()
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.max_age
+
+    def conditional_headers(self, entry):
+        if not entry:
+            return {}
+        cond = {}
+        if entry.get("etag"):
+            cond["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            cond["If-Modified-Since"] = entry["last_modified"]
+        return cond
+
+    def _write_meta(self, url, meta):
+        _, meta_path = self._paths(url)
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    def store(self, url, response, entry=None):
+        """Record a requests/httpx response; returns the page body."""
+        if response.status_code == 304 and entry:
+            # unchanged upstream: only the fetch timestamp moves
+            meta = {k: v for k, v in entry.items() if k != "body"}
+            meta["fetched_at"] = time.time()
+            self._write_meta(url, meta)
+            return entry["body"]
+        if response.status_code == 200:
+            body_path, _ = self._paths(url)
+            with open(body_path, "w", encoding="utf-8") as f:
+                f.write(response.text)
+            # metadata last, so a crash never leaves meta without a body
+            self._write_meta(url, {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time()
+            })
+        return response.text
+
+
+class Checkpoint:
+    """Append-only list of engine URLs already scraped in an unfinished run."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.done = {line.strip() for line in f if line.strip()}
+        self.file = open(path, "a", encoding="utf-8")
+
+    def mark(self, url):
+        if url not in self.done:
+            self.done.add(url)
+            self.file.write(url + "\n")
+            self.file.flush()
+
+    def reset(self):
+        # the output is being started over: nothing listed so far is in it
+        self.done.clear()
+        self.file.seek(0)
+        self.file.truncate()
+
+    def finish(self):
+        # the run completed: the next run starts from the cache alone
+        self.file.close()
+        os.remove(self.path)
+
+
+def drop_partial_line(path):
+    """Cut a trailing line left unterminated by a killed run."""
+    with open(path, "rb+") as f:
+        end = pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            newline = f.read(step).rfind(b"\n")
+            if newline != -1:
+                pos += newline + 1
+                break
+        if pos != end:
+            f.truncate(pos)
+
+
+class NDJSONWriter:
+    """
+    Streams parsed pages to `path`, one JSON record per line. Lines are
+    flushed every `flush_every` records and the checkpoint only advances
+    past flushed records, so a resumed run never skips a page it lost.
+    """
+
+    def __init__(self, path, checkpoint=None, append=False, flush_every=NDJSON_FLUSH_EVERY):
+        if append and os.path.exists(path):
+            drop_partial_line(path)
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+        self.checkpoint = checkpoint
+        self.flush_every = flush_every
+        self.pending = []
+        self.count = 0
+
+    def write(self, url, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.pending.append(url)
+        self.count += 1
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        if self.checkpoint:
+            for url in self.pending:
+                self.checkpoint.mark(url)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def compact_ndjson(ndjson_path, json_path):
+    """
+    Rewrite an NDJSON stream as the legacy indent=2 JSON array, one record
+    at a time. Repeated lines (a page redone after a crash between flush
+    and checkpoint) are written once. Returns the number of records.
+    """
+    seen = set()
+    count = 0
+    tmp = json_path + ".tmp"
+    with open(ndjson_path, "r", encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as out:
+        out.write("[")
+        for line in src:
+            line = line.strip()
+            digest = hashlib.sha1(line.encode("utf-8")).digest()
+            if not line or digest in seen:
+                continue
+            seen.add(digest)
+            item = json.dumps(json.loads(line), indent=2, ensure_ascii=False)
+            out.write(("," if count else "") + "\n  " + item.replace("\n", "\n  "))
+            count += 1
+        out.write("\n]" if count else "]")
+    os.replace(tmp, json_path)
+    return count
+
+
+def fetch_engine_page(url, cache=None):
+    """
+    Page body for url, served from the cache when fresh.
+    Returns (html, hit_network).
+    """
+    entry = cache.get(url) if cache else None
+    if entry and cache.is_fresh(entry):
+        return entry["body"], False
+    print("Scraping engine:", url)
+    if not cache:
+        return requests.get(url, headers=headers).text, True
+    r = requests.get(url, headers={**headers, **cache.conditional_headers(entry)})
+    return cache.store(url, r, entry), True
+
+
+# ------------------------
+# ASYNC FETCHING
+# ------------------------
+class TokenBucket:
+    """Async token bucket: `rate` requests/s sustained, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def fetch_page(client, limiter, semaphore, url, cache=None):
+    entry = cache.get(url) if cache else None
+    if entry and cache.is_fresh(entry):
+        return entry["body"]
+    async with semaphore:
+        await limiter.acquire()
+        print("Scraping engine:", url)
+        if not cache:
+            return (await client.get(url)).text
+        r = await client.get(url, headers=cache.conditional_headers(entry))
+        return cache.store(url, r, entry)
+
+
+async def scrape_engine_pages_async(urls, on_record, concurrency=ASYNC_CONCURRENCY, rps=REQUESTS_PER_SECOND, cache=None):
+    """
+    Fetch engine pages concurrently and parse them with parse_engine_page.
+    Each parsed page is handed to on_record(url, record) in `urls` order;
+    failed pages are skipped.
+    """
+    limiter = TokenBucket(rps)
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30, follow_redirects=True) as client:
+        tasks = [
+            asyncio.create_task(fetch_page(client, limiter, semaphore, url, cache))
+            for url in urls
+        ]
+        for url, task in zip(urls, tasks):
+            try:
+                record = parse_engine_page(await task)
+            except Exception as e:
+                print("Error:", e)
+                continue
+            on_record(url, record)
+
+
+async def scrape_engine_pages_pipelined(urls, on_record, concurrency=ASYNC_CONCURRENCY, rps=REQUESTS_PER_SECOND,
+                                       parse_workers=PARSE_WORKERS, cache=None):
+    """
+    Staged fetch -> parse pipeline. `concurrency` fetch workers push raw
+    pages onto a bounded queue; `parse_workers` processes run
+    parse_engine_page and each parsed record is handed to
+    on_record(url, record) as soon as it is ready (completion order, not
+    `urls` order). A full queue blocks the fetchers, so memory stays flat
+    however many links there are.
+    """
+    pending = iter(urls)
+    pages = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    limiter = TokenBucket(rps)
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    loop = asyncio.get_running_loop()
+
+    async def fetcher(client):
+        for url in pending:
+            try:
+                html = await fetch_page(client, limiter, semaphore, url, cache)
+            except Exception as e:
+                print("Error:", e)
+                continue
+            await pages.put((url, html))
+
+    async def parser(pool):
+        while (item := await pages.get()) is not None:
+            url, html = item
+            try:
+                record = await loop.run_in_executor(pool, parse_engine_page, html)
+            except Exception as e:
+                print("Error:", e)
+                continue
+            on_record(url, record)
+
+    with ProcessPoolExecutor(parse_workers) as pool:
+        parsers = [asyncio.create_task(parser(pool)) for _ in range(parse_workers)]
+        async with httpx.AsyncClient(headers=headers, limits=limits, timeout=30, follow_redirects=True) as client:
+            await asyncio.gather(*(fetcher(client) for _ in range(concurrency)))
+        for _ in parsers:
+            await pages.put(None)
+        await asyncio.gather(*parsers)
+
+
 # ------------------------
 # SCRAPE ALL ENGINE LINKS
 # ------------------------
@@ -115,40 +453,90 @@ def scrape_engine_list(start_url):
 # ------------------------
 # MAIN SCRAPER
 # ------------------------
-def run(arg):
+def run(arg, use_async=False, concurrency=ASYNC_CONCURRENCY, rps=REQUESTS_PER_SECOND, use_cache=True, max_age=CACHE_MAX_AGE,
+        pipeline=False, parse_workers=PARSE_WORKERS, compact=True):
     start_url = "https://www.autoparts-24.com/engine/code/"+arg
     engine_links = scrape_engine_list(start_url)
 
     print(f"Found {len(engine_links)} engine pages.")
 
-    all_data = []
-
-    for url in engine_links:
-        try:
-            data = scrape_engine_page(url)
-            all_data.append(data)
-
-            time.sleep(1)  # be polite
-        except Exception as e:
-            print("Error:", e)
+    # A checkpoint left by an interrupted run lists pages whose records are
+    # already in the NDJSON output; the run appends the rest to it.
+    output_file = arg + "_engines.ndjson"
+    cache = ResponseCache(max_age=max_age) if use_cache else None
+    checkpoint = Checkpoint(arg + "_checkpoint.txt") if use_cache else None
+    resume = bool(checkpoint and checkpoint.done and os.path.exists(output_file))
+    if resume:
+        engine_links = [url for url in engine_links if url not in checkpoint.done]
+        print(f"Resuming: {len(checkpoint.done)} pages already done.")
+    elif checkpoint and checkpoint.done:
+        # e.g. the output was deleted, or the checkpoint predates the NDJSON
+        # output (it then meant "in cache", not "written")
+        print(f"Ignoring checkpoint of {len(checkpoint.done)} pages: {output_file} is missing.")
+        checkpoint.reset()
+
+    writer = NDJSONWriter(output_file, checkpoint, append=resume)
+
+    try:
+        if pipeline:
+            asyncio.run(scrape_engine_pages_pipelined(
+                engine_links, writer.write, concurrency, rps, parse_workers, cache
+            ))
+        elif use_async:
+            asyncio.run(scrape_engine_pages_async(engine_links, writer.write, concurrency, rps, cache))
+        else:
+            for url in engine_links:
+                try:
+                    html, hit_network = fetch_engine_page(url, cache)
+                    writer.write(url, parse_engine_page(html))
+
+                    if hit_network:
+                        time.sleep(1)  # be polite
+                except Exception as e:
+                    print("Error:", e)
+    finally:
+        writer.close()
 
     # SAVE OUTPUT
-    with open(arg+"_engines.json", "w", encoding="utf-8") as f:
-        json.dump(all_data, f, indent=2, ensure_ascii=False)
+    if compact:
+        compact_ndjson(output_file, arg + "_engines.json")
 
-    print("Scraping completed! Data saved to audi_engines.json")
+    if checkpoint:
+        checkpoint.finish()
 
-# start_url = "https://www.autoparts-24.com/engine/code/audi/"
-
-if len(sys.argv) < 2:
-    print("Please provide an argument!")
-    sys.exit(1)
+    print(f"Scraping completed! Data saved to {output_file}")
 
-arg = sys.argv[1]  # first argument
+def option(name, default):
+    if name in sys.argv:
+        return type(default)(sys.argv[sys.argv.index(name) + 1])
+    return default
 
 
-# if __name__ == "__main__":
-#     run(arg)
-
+# start_url = "https://www.autoparts-24.com/engine/code/audi/"
 
-scrape_engine_page(arg)
\ No newline at end of file
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Please provide an argument!")
+        sys.exit(1)
+
+    arg = sys.argv[1]  # first argument
+
+    # python main.py <engine page url>                  -> scrape one page
+    # python main.py audi [--async] [--concurrency 8] [--rps 2]
+    #                     [--no-cache] [--max-age SECONDS]
+    #                     [--pipeline] [--parse-workers N]
+    #                     [--no-compact]
+    if arg.startswith("http"):
+        scrape_engine_page(arg)
+    else:
+        run(
+            arg,
+            use_async="--async" in sys.argv,
+            concurrency=option("--concurrency", ASYNC_CONCURRENCY),
+            rps=option("--rps", REQUESTS_PER_SECOND),
+            use_cache="--no-cache" not in sys.argv,
+            max_age=option("--max-age", CACHE_MAX_AGE),
+            pipeline="--pipeline" in sys.argv,
+            parse_workers=option("--parse-workers", PARSE_WORKERS),
+            compact="--no-compact" not in sys.argv
+        )
\ No newline at end of file
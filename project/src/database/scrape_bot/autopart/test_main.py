@@ -0,0 +1,108 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import main
+from main import ENGINE_CONTENT_CLASS, fetch_engine_page, parse_engine_page, scrape_engine_pages_async
+
+# Async fetch mode against a local stand-in of autoparts-24 engine pages:
+#   cd project/src/database/scrape_bot/autopart && python -m pytest -q
+
+PAGES = 30
+RPS = 20.0
+
+
+def engine_page(code):
+    stats = "".join(f"<tr><td>{k}:</td><td>{v}</td></tr>" for k, v in (
+        ("Enginecode", code), ("Motortype", "DIESEL"), ("Horsepower (HP)", str(100 + len(code)))
+    ))
+    models = (
+        '<tr><td><div class="faq__category">AUDI A4</div></td></tr>'
+        f'<tr><td><h4>AUDI A4 (8K2, B8)</h4></td><td>A4 2.0 TDI {code}</td><td>2007 - 2015</td></tr>'
+        '<tr><td>A4 Avant 2.0 TDI</td><td>2008 - 2015</td></tr>'
+    )
+    return (
+        f'<html><body><div class="{ENGINE_CONTENT_CLASS}">'
+        f'<table class="engine_code_stats">{stats}</table>'
+        f'<table id="models">{models}</table></div></body></html>'
+    )
+
+
+@pytest.fixture
+def server():
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            requests_seen.append(time.monotonic())
+            body = engine_page(self.path.rsplit("/", 1)[-1]).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}/engine/code"
+    yield [f"{base}/E{i:03d}" for i in range(PAGES)], requests_seen
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def scrape_async(urls, concurrency=8, rps=RPS):
+    records = []
+    asyncio.run(scrape_engine_pages_async(urls, lambda url, record: records.append((url, record)), concurrency, rps))
+    return records
+
+
+def test_async_output_matches_sync(server):
+    urls, _ = server
+    sync = [(url, parse_engine_page(fetch_engine_page(url)[0])) for url in urls]
+    assert scrape_async(urls) == sync
+    assert sync[0][1]["engine_info"]["Enginecode"] == "E000"
+
+
+def test_async_respects_rate_limit(server):
+    urls, requests_seen = server
+    scrape_async(urls)
+    assert len(requests_seen) == PAGES
+    # token bucket of capacity 1: request n starts no earlier than (n - 1) / RPS
+    times = sorted(requests_seen)
+    assert times[-1] - times[0] >= (PAGES - 1) / RPS * 0.9
+    # and no one-second window sees more than RPS + 1 requests
+    for i, t in enumerate(times):
+        assert sum(1 for u in times[i:] if u - t < 1.0) <= RPS + 1
+
+
+def test_run_without_output_discards_a_stale_checkpoint(server, tmp_path, monkeypatch):
+    urls, _ = server
+    urls = urls[:3]
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "scrape_engine_list", lambda start_url: list(urls))
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+    # left by an older run: lists a page that is in no NDJSON output
+    (tmp_path / "audi_checkpoint.txt").write_text(urls[2] + "\n", encoding="utf-8")
+
+    def crash_on_last(html):
+        if "E002" in html:
+            raise KeyboardInterrupt
+        return parse_engine_page(html)
+
+    monkeypatch.setattr(main, "parse_engine_page", crash_on_last)
+    with pytest.raises(KeyboardInterrupt):
+        main.run("audi", use_cache=True, compact=False)
+    monkeypatch.setattr(main, "parse_engine_page", parse_engine_page)
+    main.run("audi", use_cache=True, compact=False)
+
+    lines = (tmp_path / "audi_engines.ndjson").read_text(encoding="utf-8").splitlines()
+    assert sorted(json.loads(line)["engine_info"]["Enginecode"] for line in lines) == ["E000", "E001", "E002"]
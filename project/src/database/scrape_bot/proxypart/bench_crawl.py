@@ -0,0 +1,117 @@
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+# -----------------------------------------------
+# Crawl benchmark against a local stand-in of the proxyparts wiki: a
+# landing page whose #objmodel options are filled by JS after a delay,
+# behind a cookie modal, plus static model pages. Times the single-driver
+# crawl (fixed sleeps) against the sharded pool and checks that both
+# produce the same engine codes.
+#
+#   python bench_crawl.py [--workers 1,2,4] [--models 6] [--delay 300] [--http]
+# -----------------------------------------------
+
+LANDING = """<html><body>
+<div id="cookie"><button id="btCloseCookie">OK</button></div>
+<select id="objmake"><option value="">Make</option>{makes}</select>
+<select id="objmodel"><option value="">Model</option></select>
+<script>
+var MODELS = {models};
+if (document.cookie.indexOf("consent=1") >= 0) document.getElementById("cookie").style.display = "none";
+document.getElementById("btCloseCookie").onclick = function () {{
+  document.cookie = "consent=1; path=/";
+  document.getElementById("cookie").style.display = "none";
+}};
+document.getElementById("objmake").onchange = function () {{
+  var make = this.value, select = document.getElementById("objmodel");
+  select.innerHTML = '<option value="">Model</option>';
+  setTimeout(function () {{
+    (MODELS[make] || []).forEach(function (m) {{
+      var o = document.createElement("option"); o.value = m; o.text = m; select.appendChild(o);
+    }});
+  }}, {delay});
+}};
+</script></body></html>"""
+
+
+def model_page(make, model, index):
+    # two make-specific codes, plus one every make lists (as VAG engines are)
+    codes = [f"{make[:2].upper()}{index:02d}", f"{make[:2].upper()}{index + 1:02d}", f"EA{index:03d}"]
+    body = "".join(
+        f'<h2 id="{code.lower()}">{code}</h2><table>'
+        f'<tr class="data"><td>{make} {model}</td><td><div class="row"><span>{2000 + index}</span></div></td></tr>'
+        "</table>"
+        for code in codes
+    )
+    return f'<html><body><div class="codes">{body}</div></body></html>'
+
+
+def write_site(root, brands, models_per_make, delay):
+    """The stand-in site; its make <select> lists `brands` in the given order."""
+    wiki = os.path.join(root, "wiki", "engine-codes")
+    models = {make: [f"M{i}" for i in range(models_per_make)] for make in brands}
+    os.makedirs(wiki, exist_ok=True)
+    makes_html = "".join(f'<option value="{m}">{m}</option>' for m in brands + ["Lada"])
+    with open(os.path.join(wiki, "index.html"), "w", encoding="utf-8") as f:
+        f.write(LANDING.format(makes=makes_html, models=json.dumps(models), delay=delay))
+    for make, names in models.items():
+        for i, model in enumerate(names):
+            page_dir = os.path.join(wiki, "make", make.lower(), "model", model.lower())
+            os.makedirs(page_dir, exist_ok=True)
+            with open(os.path.join(page_dir, "index.html"), "w", encoding="utf-8") as f:
+                f.write(model_page(make, model, i))
+
+
+def serve(root):
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def option(name, default):
+    if name in sys.argv:
+        return type(default)(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
+def main():
+    worker_counts = [int(n) for n in option("--workers", "1,2,4").split(",")]
+    use_http = "--http" in sys.argv
+
+    root = tempfile.mkdtemp(prefix="proxyparts_site_")
+    server = serve(root)
+    # read by main.py at import, and inherited by the worker processes
+    os.environ["PROXYPARTS_WIKI_URL"] = f"http://127.0.0.1:{server.server_port}/wiki/engine-codes/"
+    import main as crawler
+
+    write_site(root, crawler.target_brands, option("--models", 6), option("--delay", 300))
+
+    start = time.perf_counter()
+    reference = crawler.crawl_single(use_http, headless=True)
+    baseline = time.perf_counter() - start
+    results = [("single driver", baseline, True)]
+
+    for workers in worker_counts:
+        start = time.perf_counter()
+        engine_data = crawler.crawl_sharded(workers, use_http)
+        results.append((f"sharded x{workers}", time.perf_counter() - start, engine_data == reference))
+
+    server.shutdown()
+    print(f"\n{len(reference)} engine codes")
+    print(f"{'mode':<16} {'seconds':>8} {'speedup':>8}  same output")
+    for name, seconds, same in results:
+        print(f"{name:<16} {seconds:>8.2f} {baseline / seconds:>7.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
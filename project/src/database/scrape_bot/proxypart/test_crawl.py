@@ -0,0 +1,74 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+import bench_crawl
+
+# Sharded and single-driver crawls against the bench_crawl stand-in site.
+# Needs selenium, and a Chrome driver for the browser tests:
+#   cd project/src/database/scrape_bot/proxypart && python -m pytest -q
+
+pytest.importorskip("selenium")
+
+BRANDS = ["Skoda", "Audi", "Seat", "BMW"]  # not in target_brands order
+MODELS = 2
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_crawler():
+    # main.py by path, under its own name: scrape_bot/autopart has a main
+    # module too. Worker processes are forked and find it in sys.modules.
+    spec = importlib.util.spec_from_file_location("proxypart_main", os.path.join(HERE, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def crawler(tmp_path, monkeypatch):
+    server = bench_crawl.serve(str(tmp_path))
+    # read by main.py at import; worker processes inherit the patched module
+    monkeypatch.setenv("PROXYPARTS_WIKI_URL", f"http://127.0.0.1:{server.server_port}/wiki/engine-codes/")
+    main = load_crawler()
+    monkeypatch.setattr(main, "WIKI_URL", os.environ["PROXYPARTS_WIKI_URL"])
+    monkeypatch.setattr(main, "target_brands", sorted(BRANDS))
+    bench_crawl.write_site(str(tmp_path), BRANDS, MODELS, 50)
+    yield main
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def driver_available(crawler):
+    try:
+        crawler.make_driver(headless=True).quit()
+    except Exception as e:
+        pytest.skip(f"no Chrome driver: {e}")
+
+
+def stand_in_shard(brands, use_http=False, headless=True):
+    # crawl_shard without a browser: the stand-in lists BRANDS in this order
+    main = sys.modules["proxypart_main"]
+    pages = [(make, f"M{i}") for make in BRANDS if make in brands for i in range(MODELS)]
+    results = []
+    for make, model in pages:
+        html = bench_crawl.model_page(make, model, int(model[1:]))
+        results.append((make, model, None if use_http else main.parse_model_page(html)))
+    return BRANDS, results
+
+
+def test_shards_merge_in_site_make_order(crawler, monkeypatch):
+    monkeypatch.setattr(crawler, "crawl_shard", stand_in_shard)
+    engine_data = crawler.crawl_sharded(3)
+    assert [car["category"].split()[0] for car in engine_data["EA000"]["cars"]] == BRANDS
+
+
+@pytest.mark.parametrize("use_http", [False, True])
+def test_sharded_crawl_matches_single_driver(crawler, driver_available, use_http):
+    reference = crawler.crawl_single(use_http, headless=True)
+    # codes shared across makes list their cars in the site's make order
+    assert [car["category"].split()[0] for car in reference["EA000"]["cars"]] == BRANDS
+    assert crawler.crawl_sharded(2, use_http) == reference
@@ -1,31 +1,31 @@
-import subprocess
-import sys
-
-# List of required modules
-required_modules = [
-    "fastapi",
-    "uvicorn",
-    "pydantic",
-    "rapidfuzz"
-]
-
-# Install any missing modules
-for module in required_modules:
-    try:
-        __import__(module)
-    except ImportError:
-        print(f"Installing missing module: {module}")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", module])
-
-
+import time
 
+# Cold start is timed from here; dependencies are declared in
+# requirements.txt (pip install -r requirements.txt), not installed on import
+STARTUP_STARTED = time.perf_counter()
 
+import bisect
+import gc
+import hashlib
 import json
+import multiprocessing
+import os
 import re
-from rapidfuzz import fuzz
-from fastapi import FastAPI
-from pydantic import BaseModel
+import signal
+import socket
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+import numpy as np
+from rapidfuzz import fuzz, process
+from fastapi import FastAPI, Response
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
 import uvicorn
+from engine_snapshot import read_snapshot, read_snapshot_header, rows_from_engine_dicts, source_hashes
+
+IMPORTS_DONE = time.perf_counter()
 
 # -----------------------------------------------
 # CONFIGURATION
@@ -38,6 +38,10 @@ DB_FILES = [
     "engine_codes.json"   # Lower priority
 ]
 
+# Compiled from DB_FILES by build_engine_dict.py --snapshot (or
+# engine_snapshot.py); used instead of the JSON files when up to date.
+DB_SNAPSHOT = "engine_index.snap"
+
 DB_WEIGHTS = {
     "engine_data.json": 1.0,
     "engine_codes.json": 0.75
@@ -74,6 +78,9 @@ ENGINE_TYPE_MAP = {
     "phev": "hybrid"
 }
 
+# Brands that must always use DB2
+DB2_ONLY_BRANDS = {"vw", "volkswagen", "aston martin", "bentley", "lamborghini"}
+
 SCORING_WEIGHTS = {
     "model": 0.5,
     "engine_type": 0.3,
@@ -83,6 +90,73 @@ SCORING_WEIGHTS = {
     "hp": 0.1
 }
 
+# "Now" / open-ended DB year ranges end here
+YEAR_OPEN_END = 9999
+
+# Queries scored per cdist call; bounds the (queries x strings) matrix size
+MATRIX_QUERY_CHUNK = 64
+
+# Parallel scoring (opt-in): cdist calls making at least
+# PARALLEL_MIN_COMPARISONS string comparisons (large brands such as vw)
+# run on SCORING_WORKERS threads (-1 = all cores, 1 = always serial);
+# smaller ones stay serial, where starting the threads costs more than it
+# saves. Off by default: every concurrent request in the endpoint
+# threadpool would start its own threads, and the gain is unmeasured.
+# Pre-forked serving always scores serially.
+SCORING_WORKERS = 1
+PARALLEL_MIN_COMPARISONS = 4000
+
+# Largest top_n a /query or /query/batch request may ask for
+MAX_TOP_N = 50
+
+# /query result cache: max entries, and seconds before an entry expires
+# (0 = never). Keys include the dataset version, so a reload clears it.
+QUERY_CACHE_SIZE = 4096
+QUERY_CACHE_TTL = 3600
+
+# Seconds between mtime checks of the database files for an automatic
+# hot reload; 0 disables the watcher (POST /admin/reload still works)
+RELOAD_WATCH_INTERVAL = 0
+
+# N-gram search: candidates retrieved by character-trigram overlap on
+# model, chassis and engine name before exact scoring. NGRAM_TOP_K is the
+# recall knob: more candidates, better recall, slower queries.
+NGRAM_SIZE = 3
+NGRAM_TOP_K = 200
+
+# Exact engine-code fast path: a query whose engine name carries a known
+# code, in parentheses ("1.4 TSi (CTHG) 180 PK") or BMW style ("N57 D30"),
+# returns that code's entries without fuzzy scoring, DB1 entries first.
+# They get CODE_MATCH_SCORE, the best score the fuzzy scorer can give, so
+# scores stay comparable across queries. Shorter codes ("20", "KP") are
+# too generic to trust.
+CODE_FAST_PATH = True
+CODE_MIN_LENGTH = 3
+CODE_MATCH_SCORE = 100.0 * sum(SCORING_WEIGHTS.values())
+BMW_CODE_RE = re.compile(r"[bmns]\d{2}[a-z]\d{2}[a-z]{0,2}")
+BMW_FAMILY_RE = re.compile(r"[BMNS]\d{2}[A-Z]\d{2}[A-Z]{1,2}")
+
+# GET /metrics histogram buckets: stage/request seconds, and candidate and
+# fuzzy-comparison counts per query. SERVER_TIMING adds a Server-Timing
+# header with the stage durations to /query responses.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+CANDIDATE_BUCKETS = (0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+COMPARISON_BUCKETS = (0, 100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+SERVER_TIMING = False
+
+# Cold start: the index is loaded by the FastAPI lifespan (from the
+# snapshot when it is fresh) and one warm-up query is answered before the
+# first request. A start slower than STARTUP_BUDGET seconds is reported.
+STARTUP_BUDGET = 2.0
+WARMUP_QUERY = "audi | a4 | 2015 | 2.0 tdi | 150 | diesel"
+
+# Pre-fork serving (python search_engine.py --workers N): the parent loads
+# the index once and forks N uvicorn workers on one listening socket; they
+# share the index pages copy-on-write instead of each loading a copy.
+HOST = "127.0.0.1"
+PORT = 8000
+WORKERS = 1
+
 # -----------------------------------------------
 # HELPERS
 # -----------------------------------------------
@@ -107,14 +181,206 @@ def normalize_engine_type(t):
             return val
     return t
 
-def load_databases(file_list):
-    result = []
-    for file in file_list:
-        with open(f"{DATA_DIR}/{file}", "r", encoding="utf-8") as f:
-            data = json.load(f)
-        weight = DB_WEIGHTS.get(file, 1.0)
-        result.append((data, weight))
-    return result
+def load_databases(file_list, timer=None):
+    # `timer` (a StageTimer) receives read_snapshot or read_json, then
+    # build_index, so callers can see which source a load came from.
+    timer = timer or StageTimer()
+    json_paths = [f"{DATA_DIR}/{file}" for file in file_list]
+    snapshot_path = f"{DATA_DIR}/{DB_SNAPSHOT}"
+    if snapshot_is_fresh(snapshot_path, json_paths):
+        with timer.stage("read_snapshot"):
+            table = read_snapshot(snapshot_path)
+        if table["db_files"] == list(file_list):
+            with timer.stage("build_index"):
+                return build_search_index(table, dataset_version([snapshot_path]))
+
+    with timer.stage("read_json"):
+        named_dicts = []
+        for file, path in zip(file_list, json_paths):
+            with open(path, "r", encoding="utf-8") as f:
+                named_dicts.append((file, json.load(f)))
+        table = rows_from_engine_dicts(named_dicts)
+    with timer.stage("build_index"):
+        return build_search_index(table, dataset_version(json_paths))
+
+def dataset_version(paths):
+    # Content hash of the files an index was built from
+    h = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()[:16]
+
+def snapshot_is_fresh(snapshot_path, json_paths):
+    # Fresh when it was compiled from exactly the JSON files present (by
+    # content hash, not mtime); a deployment may ship the snapshot alone
+    if not os.path.exists(snapshot_path):
+        return False
+    try:
+        sources = read_snapshot_header(snapshot_path).get("sources", {})
+    except (OSError, ValueError):
+        return False
+    present = [p for p in json_paths if os.path.exists(p)]
+    return all(sources.get(name) == digest for name, digest in source_hashes(present).items())
+
+def category_brand(category):
+    return normalize_brand(category.split()[0]) if category else ""
+
+def entry_hp(hp):
+    # NaN when there is no usable HP value
+    return float(hp) if hp and str(hp).isdigit() else np.nan
+
+def build_search_index(table, version=None):
+    # Derives the scoring columns from the raw row table (JSON or snapshot)
+    # and splits them into brand partitions so step 1 is a dict lookup.
+    # Rows keep the old full-scan order (DB1 first, then DB2), which keeps
+    # tie ordering in step 2 unchanged.
+    engine_types = {}
+    parsed_years = {}
+    year_start, year_end, year_starts = [], [], []
+    year_ends = np.append(table["year_starts"][1:], len(table["year"]))
+    for lo, hi in zip(table["year_starts"], year_ends):
+        year_starts.append(len(year_start))
+        for y_str in table["year"][lo:hi]:
+            if y_str not in parsed_years:
+                parsed_years[y_str] = parse_year_intervals(y_str)
+            for start, end in parsed_years[y_str]:
+                year_start.append(start)
+                year_end.append(end)
+
+    rows = {
+        "code": table["code"],
+        "description": table["description"],
+        "model": table["model"],
+        "model_starts": np.asarray(table["model_starts"]),
+        "model_len": token_sort_lengths(table["model"]),
+        "chassis": table["chassis"],
+        "chassis_starts": np.asarray(table["chassis_starts"]),
+        "chassis_len": token_sort_lengths(table["chassis"]),
+        "engine_type": engine_types,
+        "engine_type_ids": np.array([engine_types.setdefault(t, len(engine_types)) for t in table["engine_type"]], dtype=np.int64),
+        "engine_name": table["engine_name"],
+        "engine_name_len": token_sort_lengths(table["engine_name"]),
+        "year_start": np.array(year_start, dtype=np.int16),
+        "year_end": np.array(year_end, dtype=np.int16),
+        "year_starts": np.array(year_starts, dtype=np.int64),
+        "hp": np.array([entry_hp(hp) for hp in table["hp"]], dtype=np.float64),
+        "db_weight": np.array([DB_WEIGHTS.get(f, 1.0) for f in table["db_files"]], dtype=np.float64)[table["db"]]
+    }
+    for field in ("model", "chassis", "engine_name"):
+        rows[f"{field}_vocab"], rows[f"{field}_ids"] = distinct_ids(rows[field])
+
+    # A row joins the partition of every brand among its cars' categories
+    brands = {}
+    db2_brands = {}
+    category_ends = np.append(table["category_starts"][1:], len(table["category"]))
+    for row, (lo, hi) in enumerate(zip(table["category_starts"], category_ends)):
+        for brand in dict.fromkeys(category_brand(c) for c in table["category"][lo:hi]):
+            brands.setdefault(brand, []).append(row)
+            if table["db"][row] > 0:
+                db2_brands.setdefault(brand, []).append(row)
+
+    return {
+        "version": version,
+        "rows": rows,
+        "db_files": table["db_files"],
+        "all": build_score_columns(rows, np.arange(len(rows["code"]))),
+        "brands": {b: build_score_columns(rows, r) for b, r in brands.items()},
+        "db2_brands": {b: build_score_columns(rows, r) for b, r in db2_brands.items()},
+        "empty": build_score_columns(rows, []),
+        "ngrams": build_ngram_index(rows),
+        "codes": build_code_index(rows["code"])
+    }
+
+def normalize_code(code):
+    return re.sub(r"[\s\-]+", "", code.upper())
+
+def build_code_index(codes):
+    # Normalized engine code -> rows (ascending). The database keys are the
+    # Enginecode values, so the keys of both files are indexed; BMW variant
+    # codes ("N57 D30 B") are also reachable through their family ("N57D30").
+    index = {}
+    for row, code in enumerate(codes):
+        code = normalize_code(code)
+        index.setdefault(code, []).append(row)
+        if BMW_FAMILY_RE.fullmatch(code):
+            family = index.setdefault(code[:6], [])
+            if not family or family[-1] != row:
+                family.append(row)
+    return {code: np.array(rows, dtype=np.int64) for code, rows in index.items()}
+
+def token_sort_lengths(strings):
+    # Length of each string as token_sort_ratio compares it (tokens sorted
+    # and re-joined by single spaces); used for score upper bounds.
+    return np.array([len(" ".join(s.split())) for s in strings], dtype=np.int64)
+
+def distinct_ids(strings):
+    # (distinct strings, id of each string into them); the bounded search
+    # scores each distinct string once
+    vocab = {}
+    ids = np.array([vocab.setdefault(s, len(vocab)) for s in strings], dtype=np.int64)
+    return np.array(list(vocab), dtype=object), ids
+
+def take_segments(values, starts, selected):
+    # Gathers the flat-column slices of the selected rows; returns the new
+    # flat column and its rebased start offsets.
+    ends = np.append(starts[1:], len(values))
+    lengths = ends[selected] - starts[selected]
+    new_starts = np.zeros(len(selected), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=new_starts[1:])
+    idx = np.repeat(starts[selected] - new_starts, lengths) + np.arange(lengths.sum())
+    if isinstance(values, np.ndarray):
+        return values[idx], new_starts
+    return [values[i] for i in idx], new_starts
+
+def build_score_columns(rows, selected):
+    # Score columns for one partition of rows. Multi-valued fields (model,
+    # chassis, year intervals) are one flat column plus the start offset
+    # of each entry's slice into it.
+    selected = np.asarray(selected, dtype=np.int64)
+    models, model_starts = take_segments(rows["model"], rows["model_starts"], selected)
+    model_len, _ = take_segments(rows["model_len"], rows["model_starts"], selected)
+    model_ids, _ = take_segments(rows["model_ids"], rows["model_starts"], selected)
+    chassis, chassis_starts = take_segments(rows["chassis"], rows["chassis_starts"], selected)
+    chassis_len, _ = take_segments(rows["chassis_len"], rows["chassis_starts"], selected)
+    chassis_ids, _ = take_segments(rows["chassis_ids"], rows["chassis_starts"], selected)
+    year_start, year_starts = take_segments(rows["year_start"], rows["year_starts"], selected)
+    year_end, _ = take_segments(rows["year_end"], rows["year_starts"], selected)
+    return {
+        "rows": selected,
+        "code": [rows["code"][r] for r in selected],
+        "description": rows["description"],
+        "model": models,
+        "model_starts": model_starts,
+        "model_len": model_len,
+        "model_ids": model_ids,
+        "model_vocab": rows["model_vocab"],
+        "chassis": chassis,
+        "chassis_starts": chassis_starts,
+        "chassis_len": chassis_len,
+        "chassis_ids": chassis_ids,
+        "chassis_vocab": rows["chassis_vocab"],
+        "engine_type": list(rows["engine_type"]),
+        "engine_type_ids": rows["engine_type_ids"][selected],
+        "engine_name": [rows["engine_name"][r] for r in selected],
+        "engine_name_len": rows["engine_name_len"][selected],
+        "engine_name_ids": rows["engine_name_ids"][selected],
+        "engine_name_vocab": rows["engine_name_vocab"],
+        "year_start": year_start,
+        "year_end": year_end,
+        "year_starts": year_starts,
+        "hp": rows["hp"][selected],
+        "db_weight": rows["db_weight"][selected]
+    }
+
+def partition_candidates(columns):
+    # (code, entry, db_weight) tuples of a partition for the scalar
+    # step2_fuzzy_search; needs full entries, i.e. a JSON-loaded index.
+    return [
+        (code, columns["description"][row], weight)
+        for code, row, weight in zip(columns["code"], columns["rows"], columns["db_weight"])
+    ]
 
 def parse_year(text):
     m = re.search(r"(19|20)\d{2}", text)
@@ -123,20 +389,37 @@ def parse_year(text):
 def parse_year_range(text):
     text = text.replace("...", "").strip()
     if "->" in text:
-        left, right = text.split("->")
+        # query type names are free text: anything after a second arrow is ignored
+        left, right = text.split("->", 1)
         return parse_year(left.strip()), parse_year(right.strip())
     y = parse_year(text)
     return (y, y) if y else (None, None)
 
+YEAR_SPAN_RE = re.compile(r"((?:19|20)\d{2})\s*-+>?\s*((?:19|20)\d{2}|now)", re.IGNORECASE)
+
+def parse_year_intervals(text):
+    # DB year strings: "2010 - 2018", "2015 - Now", "2010 -> 2018", "1996",
+    # or proxyparts lists like "-, 1991, 1992, 1995". Lists collapse into
+    # runs of consecutive years: [(1991, 1992), (1995, 1995)].
+    if not text:
+        return []
+    m = YEAR_SPAN_RE.search(text)
+    if m:
+        end = m.group(2)
+        return [(int(m.group(1)), YEAR_OPEN_END if end.lower() == "now" else int(end))]
+    intervals = []
+    for y in sorted({parse_year(part) for part in text.split(",")} - {None}):
+        if intervals and y == intervals[-1][1] + 1:
+            intervals[-1] = (intervals[-1][0], y)
+        else:
+            intervals.append((y, y))
+    return intervals
+
 def match_year_range(query_start, query_end, db_year_list):
     if not db_year_list:
         return False
-    for y_str in db_year_list:
-        db_start, db_end = parse_year_range(y_str)
-        if db_start is None and db_end is None:
-            continue
-        if db_start is None: db_start = db_end
-        if db_end is None: db_end = db_start
+    intervals = [i for y_str in db_year_list for i in parse_year_intervals(y_str)]
+    for db_start, db_end in intervals:
         if query_start is None and query_end is not None:
             if db_start <= query_end:
                 return True
@@ -157,42 +440,59 @@ def parse_query(query: str):
     while len(parts) < 6:
         parts.append(None)
     brand, model, type_name, engine_name, hp, fuel_type = parts
+    # DVX type names carry the period, e.g. "8X - 2015 -> 2018"
+    year_start, year_end = parse_year_range(type_name) if type_name else (None, None)
     return {
         "brand": normalize_brand(brand),
         "model": normalize(model),
         "type_name": normalize(type_name),
         "engine_name": normalize(engine_name),
         "hp": int(hp) if hp and hp.isdigit() else None,
-        "engine_type": normalize_engine_type(fuel_type)
+        "engine_type": normalize_engine_type(fuel_type),
+        "year_start": year_start,
+        "year_end": year_end
     }
 
 # -----------------------------------------------
 # STEP 1: BRAND FILTER
 # -----------------------------------------------
 
-def step1_brand_filter(query_tokens, engine_dicts):
-    filtered_entries = []
-
-    # Brands that must always use DB2
-    db2_only_brands = ["vw", "volkswagen", "aston martin", "bentley", "lamborghini"]
+def query_codes(query_tokens):
+    # Code-like tokens of the (normalized) query engine name
+    engine_name = query_tokens["engine_name"] or ""
+    codes = [c for group in re.findall(r"\(([^)]*)\)", engine_name) for c in re.split(r"[,/]", group)]
+    for code in BMW_CODE_RE.findall(engine_name):
+        # the variant suffix may have swallowed following text
+        # ("n57d30xdrive" -> "n57d30xd"): fall back to the family code
+        codes += [code, code[:6]] if len(code) > 6 else [code]
+    return [normalize_code(c) for c in codes if len(c) >= CODE_MIN_LENGTH]
 
-    use_db2_only = query_tokens["brand"] in db2_only_brands
-
-    for idx, (data, db_weight) in enumerate(engine_dicts):
-        if use_db2_only and idx == 0:  # Skip DB1 if DB2 only brand
+def step1_code_lookup(query_tokens, columns, code_index, top_n=5):
+    # Exact-code fast path: results for the query's engine code(s) among
+    # the brand's candidates, or None to fall through to fuzzy scoring
+    if not CODE_FAST_PATH:
+        return None
+    for code in query_codes(query_tokens):
+        rows = code_index.get(code)
+        if rows is None:
             continue
+        # positions of the code's rows in this brand partition (both sorted)
+        positions = np.searchsorted(columns["rows"], rows)
+        inside = positions < len(columns["rows"])
+        positions = positions[inside][columns["rows"][positions[inside]] == rows[inside]]
+        if len(positions):
+            order = np.argsort(-columns["db_weight"][positions], kind="stable")[:top_n]
+            return [result_entry(columns, j, CODE_MATCH_SCORE) for j in positions[order]]
+    return None
 
-        for code, entry in data.items():
-            first_car = entry.get("cars", [{}])[0]
-            category = first_car.get("category", "")
-            entry_brand = normalize_brand(category.split()[0]) if category else ""
-
-            if query_tokens["brand"] and query_tokens["brand"] != entry_brand:
-                continue
-
-            filtered_entries.append((code, entry, db_weight))
-
-    return filtered_entries
+def step1_brand_filter(query_tokens, search_index):
+    # Returns the brand's score columns; shared across queries, read only.
+    brand = query_tokens["brand"]
+    if not brand:
+        return search_index["all"]
+    if brand in DB2_ONLY_BRANDS:  # Skip DB1 if DB2 only brand
+        return search_index["db2_brands"].get(brand, search_index["empty"])
+    return search_index["brands"].get(brand, search_index["empty"])
 
 # -----------------------------------------------
 # STEP 2: WEIGHTED FUZZY SEARCH
@@ -220,7 +520,7 @@ def weighted_match_score(query, entry, weights):
     score += fuzz.token_sort_ratio(query["engine_name"], entry.get("engine_name", "")) * weights["engine_name"]
 
     # Year match (from tokens.year)
-    if match_year_range(None, None, entry.get("year", [])):
+    if match_year_range(query["year_start"], query["year_end"], entry.get("year", [])):
         score += 100 * weights["year"]
 
     # HP score (if available)
@@ -244,30 +544,912 @@ def step2_fuzzy_search(query_tokens, candidate_entries, top_n=5):
     results.sort(key=lambda x: x["score"], reverse=True)
     return results[:top_n]
 
+def field_similarity(values, choices):
+    # token_sort_ratio of every value against every choice, one row per
+    # value. cdist runs once per distinct value; float64 keeps the scores
+    # bit-identical to fuzz.token_sort_ratio.
+    unique = list(dict.fromkeys(values))
+    if not choices:
+        scores = np.zeros((len(unique), 0))
+    elif SCORING_WORKERS != 1 and len(unique) * len(choices) >= PARALLEL_MIN_COMPARISONS:
+        # cdist shards its query rows across the threads, so one query
+        # against many choices is scored transposed (the scorer is
+        # symmetric). The GIL is released meanwhile, so other requests in
+        # the endpoint threadpool keep running.
+        if len(choices) > len(unique):
+            scores = process.cdist(choices, unique, scorer=fuzz.token_sort_ratio, dtype=np.float64, workers=SCORING_WORKERS).T
+        else:
+            scores = process.cdist(unique, choices, scorer=fuzz.token_sort_ratio, dtype=np.float64, workers=SCORING_WORKERS)
+    else:
+        scores = process.cdist(unique, choices, scorer=fuzz.token_sort_ratio, dtype=np.float64)
+    row = {v: i for i, v in enumerate(unique)}
+    return scores[[row[v] for v in values]]
+
+def segment_max(scores, starts):
+    # Per-entry max over each entry's slice of a flat column; 0 for entries
+    # with no strings, which adds nothing just like the scalar "if scores:".
+    counts = np.diff(np.append(starts, scores.shape[1]))
+    out = np.zeros((scores.shape[0], len(starts)), dtype=scores.dtype)
+    nonempty = counts > 0
+    if nonempty.any():
+        out[:, nonempty] = np.maximum.reduceat(scores, starts[nonempty], axis=1)
+    return out
+
+def year_overlap(query_tokens_list, columns):
+    # Vectorized match_year_range: does any of an entry's year intervals
+    # overlap the query period? An open query side matches everything on
+    # that side; a query without any year matches nothing.
+    lo = np.array([q["year_start"] or 0 for q in query_tokens_list])[:, None]
+    hi = np.array([q["year_end"] or YEAR_OPEN_END for q in query_tokens_list])[:, None]
+    hit = (columns["year_start"] <= hi) & (columns["year_end"] >= lo)
+    has_year = np.array([q["year_start"] is not None or q["year_end"] is not None for q in query_tokens_list])
+    return segment_max(hit, columns["year_starts"]) & has_year[:, None]
+
+def matrix_match_scores(query_tokens_list, columns, weights):
+    # Vectorized weighted_match_score: one row of entry scores per query.
+    # Terms are summed in the same order as the scalar scorer so both
+    # produce identical floats (and therefore identical rankings).
+    model = segment_max(field_similarity([q["model"] for q in query_tokens_list], columns["model"]), columns["model_starts"])
+    chassis = segment_max(field_similarity([q["type_name"] for q in query_tokens_list], columns["chassis"]), columns["chassis_starts"])
+    fuel = field_similarity([q["engine_type"] for q in query_tokens_list], columns["engine_type"])[:, columns["engine_type_ids"]]
+    engine_name = field_similarity([q["engine_name"] for q in query_tokens_list], columns["engine_name"])
+
+    score = model * weights["model"]
+    score = score + fuel * weights["engine_type"]
+    score = score + chassis * weights["car_type"]
+    score = score + engine_name * weights["engine_name"]
+    score = score + np.where(year_overlap(query_tokens_list, columns), 100 * weights["year"], 0.0)
+    score = score + hp_scores(query_tokens_list, columns, weights)
+
+    return score * columns["db_weight"]
+
+def hp_scores(query_tokens_list, columns, weights):
+    query_hp = np.array([q["hp"] or np.nan for q in query_tokens_list])[:, None]
+    hp_score = np.maximum(0, 100 - np.abs(query_hp - columns["hp"])) * weights["hp"]
+    return np.where(np.isnan(hp_score), 0.0, hp_score)
+
+def result_entry(columns, j, score):
+    return {
+        "engine_code": columns["code"][j],
+        "score": float(score),
+        # decoded lazily when loaded from a snapshot
+        "description": columns["description"][columns["rows"][j]]["engine_info"]
+    }
+
+def step2_matrix_search(query_tokens_list, columns, top_n=5):
+    # Drop-in for step2_fuzzy_search over many queries at once; returns one
+    # result list per query. Stable ordering keeps ties in candidate order.
+    results = []
+    for i in range(0, len(query_tokens_list), MATRIX_QUERY_CHUNK):
+        chunk = query_tokens_list[i:i + MATRIX_QUERY_CHUNK]
+        scores = matrix_match_scores(chunk, columns, SCORING_WEIGHTS)
+        for row in scores:
+            top = np.argsort(-row, kind="stable")[:top_n]
+            results.append([result_entry(columns, j, row[j]) for j in top])
+    return results
+
+def ratio_upper_bound(query_len, lengths):
+    # token_sort_ratio is a normalized Indel similarity, so it can never
+    # exceed 200 * min(len) / (len1 + len2); two empty strings score 100.
+    total = query_len + lengths
+    return np.where(total > 0, 200.0 * np.minimum(query_len, lengths) / np.maximum(total, 1), 100.0)
+
+# (query token, column) of the fuzzy score terms, in total() argument order
+FUZZY_FIELDS = [("model", "model"), ("type_name", "chassis"), ("engine_name", "engine_name")]
+
+def selected_similarity(query_value, columns, field, selected):
+    # Per-entry best token_sort_ratio of query_value over the entry's
+    # strings in `field`, valid for the selected entries. Only the distinct
+    # strings of selected entries are scored, in one cdist call.
+    ids = columns[f"{field}_ids"]
+    starts = columns.get(f"{field}_starts")
+    if starts is not None:
+        selected = np.repeat(selected, np.diff(np.append(starts, len(ids))))
+    vocab = columns[f"{field}_vocab"]
+    wanted = np.zeros(len(vocab), dtype=bool)
+    wanted[ids[selected]] = True
+    needed = np.flatnonzero(wanted)
+    similarity = np.zeros(len(vocab))
+    similarity[needed] = field_similarity([query_value], vocab[needed].tolist())[0]
+    scores = similarity[ids]
+    return (scores if starts is None else segment_max(scores[None, :], starts)[0]), len(needed)
+
+def step2_bounded_search(query_tokens, columns, top_n=5):
+    # Pruned variant of step2_matrix_search with the same top-N. Fuel type,
+    # year and HP are exact (they are cheap); the fuzzy terms get length
+    # upper bounds. The top_n entries with the highest ceiling are scored
+    # exactly, and the lowest of those scores is a floor the final Nth
+    # result cannot fall below: only entries whose ceiling reaches it are
+    # scored, each distinct string once.
+    n = len(columns["code"])
+    if top_n <= 0 or n == 0:
+        return [], {"candidates": n, "scored": 0, "pruned": n, "comparisons": 0}
+
+    weights = SCORING_WEIGHTS
+    fuel = field_similarity([query_tokens["engine_type"]], columns["engine_type"])[0][columns["engine_type_ids"]]
+    year = np.where(year_overlap([query_tokens], columns)[0], 100 * weights["year"], 0.0)
+    hp = hp_scores([query_tokens], columns, weights)[0]
+
+    def total(model, chassis, engine_name):
+        # summed in matrix_match_scores order, so the floats are identical
+        score = model * weights["model"]
+        score = score + fuel * weights["engine_type"]
+        score = score + chassis * weights["car_type"]
+        score = score + engine_name * weights["engine_name"]
+        score = score + year
+        score = score + hp
+        return score * columns["db_weight"]
+
+    bounds = []
+    for token, field in FUZZY_FIELDS:
+        ub = ratio_upper_bound(len(" ".join(query_tokens[token].split())), columns[f"{field}_len"])
+        starts = columns.get(f"{field}_starts")
+        bounds.append(ub if starts is None else segment_max(ub[None, :], starts)[0])
+    ub = total(*bounds)
+
+    comparisons = len(columns["engine_type"])
+    def exact(selected):
+        nonlocal comparisons
+        terms = []
+        for token, field in FUZZY_FIELDS:
+            scores, scored = selected_similarity(query_tokens[token], columns, field, selected)
+            terms.append(scores)
+            comparisons += scored
+        return total(*terms)
+
+    seed = np.zeros(n, dtype=bool)
+    seed[np.argsort(-ub, kind="stable")[:top_n]] = True
+    floor = exact(seed)[seed].min()
+    # small slack so float rounding in the bound never prunes a tie
+    survivors = ub + 1e-6 >= floor
+    scores = np.where(survivors, exact(survivors), -np.inf)
+    top = np.argsort(-scores, kind="stable")[:top_n]
+
+    results = [result_entry(columns, j, scores[j]) for j in top]
+    scored = int(survivors.sum())
+    return results, {"candidates": n, "scored": scored, "pruned": n - scored, "comparisons": comparisons}
+
+NGRAM_FIELDS = [("model", "model"), ("chassis", "type_name"), ("engine_name", "engine_name")]
+
+def ngrams(text):
+    # Distinct padded character n-grams of the alphanumerics of a string;
+    # the padding lets short strings ("a4", "x5") produce grams too.
+    text = re.sub(r"[^a-z0-9]+", "", text.lower())
+    if not text:
+        return set()
+    padded = f" {text} "
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+def build_ngram_index(rows):
+    # Inverted index gram -> rows as one CSR pair: the rows containing gram
+    # id g are rows[starts[g]:starts[g + 1]], each listed once. Every field
+    # has its own vocabulary; its gram ids start at offsets[field].
+    n = max(len(rows["code"]), 1)
+    vocab, offsets, keys = {}, {}, []
+    next_id = 0
+    for field, _ in NGRAM_FIELDS:
+        values = rows[field]
+        if field == "engine_name":
+            owners = np.arange(len(values))
+        else:
+            starts = rows[f"{field}_starts"]
+            owners = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(values))))
+
+        # grams are extracted once per distinct string, then gathered per value
+        grams, distinct = {}, {}
+        value_ids = np.array([distinct.setdefault(text, len(distinct)) for text in values], dtype=np.int64)
+        gram_lists = [[grams.setdefault(g, len(grams)) for g in ngrams(text)] for text in distinct]
+        lengths = np.array([len(ids) for ids in gram_lists], dtype=np.int64)
+        gram_starts = np.zeros(len(gram_lists), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=gram_starts[1:])
+        flat = np.fromiter((g for ids in gram_lists for g in ids), dtype=np.int64, count=int(lengths.sum()))
+        value_grams, _ = take_segments(flat, gram_starts, value_ids)
+        keys.append((value_grams + next_id) * n + np.repeat(owners, lengths[value_ids]))
+
+        vocab[field], offsets[field] = grams, next_id
+        next_id += len(grams)
+
+    keys = np.sort(np.concatenate(keys)) if keys else np.zeros(0, dtype=np.int64)
+    keys = keys[np.append(True, keys[1:] != keys[:-1])] if len(keys) else keys
+    return {
+        "vocab": vocab,
+        "offsets": offsets,
+        "rows": (keys % n).astype(np.int32),
+        "starts": np.searchsorted(keys // n, np.arange(next_id + 1)),
+        "size": len(rows["code"])
+    }
+
+def ngram_candidates(query_tokens, columns, ngram_index, k, weights, top_n=1):
+    # Positions in `columns` of the k entries with the best retrieval
+    # score, in candidate order; None when every entry should be scored
+    # (no more than k of them). The retrieval score is the weighted match
+    # score with each fuzzy term replaced by the share of the query field's
+    # grams the entry contains; fuel type, year and HP are exact. At least
+    # top_n entries are retrieved.
+    k = max(k, top_n, 1)
+    if len(columns["code"]) <= k:
+        return None
+    starts, postings = ngram_index["starts"], ngram_index["rows"]
+    weight_of = {"model": weights["model"], "chassis": weights["car_type"], "engine_name": weights["engine_name"]}
+
+    fuel = field_similarity([query_tokens["engine_type"]], columns["engine_type"])[0][columns["engine_type_ids"]]
+    score = fuel * weights["engine_type"]
+    score = score + np.where(year_overlap([query_tokens], columns)[0], 100 * weights["year"], 0.0)
+    score = score + hp_scores([query_tokens], columns, weights)[0]
+    for field, q_field in NGRAM_FIELDS:
+        grams = ngrams(query_tokens[q_field] or "")
+        vocab, offset = ngram_index["vocab"][field], ngram_index["offsets"][field]
+        ids = [vocab[g] + offset for g in grams if g in vocab]
+        if ids:
+            hits = np.concatenate([postings[starts[i]:starts[i + 1]] for i in ids])
+            shared = np.bincount(hits, minlength=ngram_index["size"])[columns["rows"]]
+            score = score + shared * (100.0 * weight_of[field] / len(grams))
+    score = score * columns["db_weight"]
+    return np.sort(np.argpartition(-score, k)[:k])
+
+def step2_ngram_search(query_tokens, columns, ngram_index, top_n=5, k=NGRAM_TOP_K):
+    # step2_matrix_search over the top-k retrieved entries only. Retrieved
+    # entries keep their candidate order, so ties rank as in the full scan.
+    n = len(columns["code"])
+    selected = ngram_candidates(query_tokens, columns, ngram_index, k, SCORING_WEIGHTS, top_n)
+    if selected is not None:
+        retrieved = build_score_columns(columns, selected)
+        # global rows, for the description lookup in result_entry
+        retrieved["rows"] = columns["rows"][selected]
+    else:
+        retrieved = columns
+    results = step2_matrix_search([query_tokens], retrieved, top_n)[0]
+    return results, {"candidates": n, "retrieved": len(retrieved["code"]), "comparisons": fuzzy_comparisons(retrieved)}
+
+def fuzzy_comparisons(columns):
+    # token_sort_ratio evaluations matrix_match_scores makes for one query
+    return len(columns["model"]) + len(columns["chassis"]) + len(columns["engine_type"]) + len(columns["engine_name"])
+
+# -----------------------------------------------
+# INSTRUMENTATION
+# -----------------------------------------------
+
+class StageTimer:
+    """Stage durations (seconds) and candidate/comparison counts of one request."""
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {"candidates": 0, "comparisons": 0}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def add(self, columns, queries=1):
+        self.counts["candidates"] += len(columns["code"])
+        self.counts["comparisons"] += queries * fuzzy_comparisons(columns)
+
+    def server_timing(self):
+        return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items())
+
+class SearchMetrics:
+    """Thread-safe histograms and counters in the Prometheus text format."""
+
+    def __init__(self, histograms, counters):
+        # name -> (help, buckets) / name -> help, in exposition order
+        self.histograms = histograms
+        self.counters = counters
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        buckets = self.histograms[name][1]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            # per-bucket counts (last one: above every bucket), then the sum
+            series = self.series.setdefault(key, [0] * (len(buckets) + 1) + [0.0])
+            series[bisect.bisect_left(buckets, value)] += 1
+            series[-1] += value
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + value
+
+    def record(self, endpoint, timer, seconds, **labels):
+        self.inc("dvx_search_requests_total", endpoint=endpoint, **labels)
+        self.observe("dvx_search_request_seconds", seconds, endpoint=endpoint, **labels)
+        for stage, stage_seconds in timer.stages.items():
+            self.observe("dvx_search_stage_seconds", stage_seconds, endpoint=endpoint, stage=stage)
+        if "score" in timer.stages:
+            self.observe("dvx_search_candidates", timer.counts["candidates"], endpoint=endpoint)
+            self.observe("dvx_search_comparisons", timer.counts["comparisons"], endpoint=endpoint)
+
+    def render(self):
+        def label_text(labels, **extra):
+            pairs = list(labels) + list(extra.items())
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+        with self.lock:
+            series = sorted((key, list(v) if isinstance(v, list) else v) for key, v in self.series.items())
+        lines = []
+        for name, help_text in self.counters.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f"{name}{label_text(labels)} {value}" for (n, labels), value in series if n == name]
+        for name, (help_text, buckets) in self.histograms.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (n, labels), values in series:
+                if n != name:
+                    continue
+                cumulative = 0
+                for le, count in zip(list(buckets) + ["+Inf"], values[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{label_text(labels, le=le)} {cumulative}")
+                lines.append(f"{name}_sum{label_text(labels)} {values[-1]}")
+                lines.append(f"{name}_count{label_text(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+metrics = SearchMetrics(
+    histograms={
+        "dvx_search_request_seconds": ("Search time per request.", LATENCY_BUCKETS),
+        "dvx_search_stage_seconds": ("Time per search stage (parse, cache, brand_filter, code_lookup, score).", LATENCY_BUCKETS),
+        "dvx_search_candidates": ("Entries left after the brand filter, per request.", CANDIDATE_BUCKETS),
+        "dvx_search_comparisons": ("Fuzzy string comparisons made in step 2, per request.", COMPARISON_BUCKETS)
+    },
+    counters={
+        "dvx_search_requests_total": "Search requests served."
+    }
+)
+
 # -----------------------------------------------
 # FULL SEARCH
 # -----------------------------------------------
 
-def search_three_step(query, engine_dicts, top_n=5):
+def search_three_step(query, search_index, top_n=5):
     query_tokens = parse_query(query)
-    step1_candidates = step1_brand_filter(query_tokens, engine_dicts)
-    results = step2_fuzzy_search(query_tokens, step1_candidates, top_n)
+    step1_columns = step1_brand_filter(query_tokens, search_index)
+    results = step1_code_lookup(query_tokens, step1_columns, search_index["codes"], top_n)
+    if results is None:
+        results = step2_matrix_search([query_tokens], step1_columns, top_n)[0]
+    return results
+
+def search_bounded(query, search_index, top_n=5, timer=None):
+    # Same results as search_three_step; also returns pruning stats
+    timer = timer or StageTimer()
+    with timer.stage("parse"):
+        query_tokens = parse_query(query)
+    with timer.stage("brand_filter"):
+        step1_columns = step1_brand_filter(query_tokens, search_index)
+    with timer.stage("code_lookup"):
+        results = step1_code_lookup(query_tokens, step1_columns, search_index["codes"], top_n)
+    if results is not None:
+        n = len(step1_columns["code"])
+        return results, {"candidates": n, "scored": 0, "pruned": n, "comparisons": 0, "code_match": True}
+    with timer.stage("score"):
+        results, stats = step2_bounded_search(query_tokens, step1_columns, top_n)
+    stats["code_match"] = False
+    timer.counts["candidates"] += stats["candidates"]
+    timer.counts["comparisons"] += stats["comparisons"]
+    return results, stats
+
+def search_ngram(query, search_index, top_n=5, k=NGRAM_TOP_K, timer=None):
+    # search_three_step with n-gram retrieval before scoring; also returns
+    # how many entries were retrieved and scored
+    timer = timer or StageTimer()
+    with timer.stage("parse"):
+        query_tokens = parse_query(query)
+    with timer.stage("brand_filter"):
+        step1_columns = step1_brand_filter(query_tokens, search_index)
+    with timer.stage("code_lookup"):
+        results = step1_code_lookup(query_tokens, step1_columns, search_index["codes"], top_n)
+    if results is not None:
+        return results, {"candidates": len(step1_columns["code"]), "retrieved": 0, "comparisons": 0, "code_match": True}
+    with timer.stage("score"):
+        results, stats = step2_ngram_search(query_tokens, step1_columns, search_index["ngrams"], top_n, k)
+    stats["code_match"] = False
+    timer.counts["candidates"] += stats["candidates"]
+    timer.counts["comparisons"] += stats["comparisons"]
+    return results, stats
+
+def search_batch(queries, search_index, top_n=5, timer=None, errors=None):
+    # Duplicate queries (same text, or texts that parse to the same tokens)
+    # are scored once; queries are grouped by brand so each brand's
+    # candidate list is filtered and walked once for the whole batch.
+    # Queries answered by the exact-code fast path are not scored. Results
+    # are shared with /query through query_cache (same keys), so only
+    # queries missing from it are looked up or scored. A query that fails
+    # to parse, or whose brand group fails to score, gets no results and
+    # its error message in `errors` (query -> message) instead of failing
+    # the whole batch.
+    timer = timer or StageTimer()
+    errors = {} if errors is None else errors
+    version = search_index["version"]
+    query_cache.sync(version)
+    unique = {}
+    with timer.stage("parse"):
+        for query in queries:
+            if query not in unique and query not in errors:
+                try:
+                    query_tokens = parse_query(query)
+                except Exception as e:
+                    errors[query] = f"could not parse query: {e}"
+                    continue
+                unique[query] = tuple(sorted(query_tokens.items()))
+
+    results_by_key = {}
+    groups = {}
+    with timer.stage("cache"):
+        for key in set(unique.values()):
+            res = query_cache.get((version, key, top_n))
+            if res is not None:
+                results_by_key[key] = res
+            else:
+                query_tokens = dict(key)
+                groups.setdefault(query_tokens["brand"], []).append(query_tokens)
+
+    cached = set(results_by_key)
+    failed = {}
+    for query_tokens_list in groups.values():
+        try:
+            search_brand_group(query_tokens_list, search_index, top_n, timer, results_by_key)
+        except Exception as e:
+            for query_tokens in query_tokens_list:
+                failed[tuple(sorted(query_tokens.items()))] = f"search failed: {e}"
+
+    for key, res in results_by_key.items():
+        if key not in cached and key not in failed:
+            query_cache.put((version, key, top_n), res)
+    for query, key in unique.items():
+        if key in failed:
+            errors[query] = failed[key]
+    return [[] if query in errors else results_by_key[unique[query]] for query in queries]
+
+def search_brand_group(query_tokens_list, search_index, top_n, timer, results_by_key):
+    # One search_batch brand group: filter once, then code lookup, then one
+    # matrix scoring pass for the queries the lookup did not answer
+    with timer.stage("brand_filter"):
+        columns = step1_brand_filter(query_tokens_list[0], search_index)
+    with timer.stage("code_lookup"):
+        unmatched = []
+        for query_tokens in query_tokens_list:
+            res = step1_code_lookup(query_tokens, columns, search_index["codes"], top_n)
+            if res is None:
+                unmatched.append(query_tokens)
+            else:
+                results_by_key[tuple(sorted(query_tokens.items()))] = res
+    if not unmatched:
+        return
+    with timer.stage("score"):
+        batch_results = step2_matrix_search(unmatched, columns, top_n)
+    timer.add(columns, len(unmatched))
+    for query_tokens, res in zip(unmatched, batch_results):
+        results_by_key[tuple(sorted(query_tokens.items()))] = res
+
+# -----------------------------------------------
+# QUERY CACHE
+# -----------------------------------------------
+
+class QueryCache:
+    """Thread-safe LRU with optional TTL, emptied when the dataset changes."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None and self.ttl and time.monotonic() - item[0] > self.ttl:
+                del self.entries[key]
+                self.expirations += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def sync(self, version):
+        # Drop everything cached against an older dataset
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+
+    def stats(self):
+        with self.lock:
+            return {
+                "version": self.version,
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+
+def cached_search(query, search_index, top_n=5, timer=None):
+    # Keyed on the parsed tokens, so spacing/case variants of a query that
+    # normalize the same way share one entry.
+    timer = timer or StageTimer()
+    query_cache.sync(search_index["version"])
+    with timer.stage("parse"):
+        query_tokens = parse_query(query)
+    key = (search_index["version"], tuple(sorted(query_tokens.items())), top_n)
+    with timer.stage("cache"):
+        results = query_cache.get(key)
+    if results is None:
+        with timer.stage("brand_filter"):
+            step1_columns = step1_brand_filter(query_tokens, search_index)
+        with timer.stage("code_lookup"):
+            results = step1_code_lookup(query_tokens, step1_columns, search_index["codes"], top_n)
+        if results is None:
+            with timer.stage("score"):
+                results = step2_matrix_search([query_tokens], step1_columns, top_n)[0]
+            timer.add(step1_columns)
+        query_cache.put(key, results)
     return results
 
+# -----------------------------------------------
+# COLD START
+# -----------------------------------------------
+
+search_index = None
+startup_status = {"loaded": False}
+
+def load_search_index():
+    # Loads the index and answers WARMUP_QUERY, then publishes it and
+    # records the startup breakdown (seconds) against STARTUP_BUDGET.
+    global search_index
+    timer = StageTimer()
+    timer.stages["imports"] = IMPORTS_DONE - STARTUP_STARTED
+    index = load_databases(DB_FILES, timer)
+    with timer.stage("warmup_query"):
+        search_three_step(WARMUP_QUERY, index)
+    search_index = index
+
+    total = time.perf_counter() - STARTUP_STARTED
+    startup_status.update({
+        "loaded": True,
+        "version": index["version"],
+        "source": "snapshot" if "read_snapshot" in timer.stages and "read_json" not in timer.stages else "json",
+        "stages": timer.stages,
+        "total": total,
+        "budget": STARTUP_BUDGET,
+        "within_budget": total <= STARTUP_BUDGET
+    })
+    breakdown = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timer.stages.items())
+    print(f"Startup {total:.3f}s ({breakdown}) from {startup_status['source']}, budget {STARTUP_BUDGET:.1f}s")
+    if not startup_status["within_budget"]:
+        print(f"WARNING: startup over budget by {total - STARTUP_BUDGET:.3f}s")
+        if startup_status["source"] == "json":
+            print("Hint: compile a snapshot with build_engine_dict.py --snapshot or engine_snapshot.py")
+    return index
+
+# -----------------------------------------------
+# PRE-FORK WORKERS
+# -----------------------------------------------
+
+def process_memory():
+    # kB from /proc/self/smaps_rollup (Linux). Pss splits shared pages
+    # between the processes mapping them, so summing it over the workers
+    # gives their real combined footprint; Rss counts shared pages in full.
+    memory = {"pid": os.getpid()}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"):
+                    memory[name.lower()] = int(value.split()[0])
+    except OSError:
+        pass
+    return memory
+
+# pid of the pre-fork parent, inherited by its workers; None otherwise
+prefork_parent = None
+
+# The parent's reload_status as JSON, in shared memory its workers read
+# (GET /admin/reload); None when not pre-forked
+parent_reload_status = None
+RELOAD_STATUS_BYTES = 4096
+
+def publish_reload_status():
+    if parent_reload_status is None:
+        return
+    status = dict(reload_status, version=search_index["version"] if search_index else None)
+    if status["last_error"]:
+        status["last_error"] = status["last_error"][:RELOAD_STATUS_BYTES // 2]
+    with parent_reload_status.get_lock():
+        parent_reload_status.value = json.dumps(status).encode("utf-8")
+
+def read_parent_reload_status():
+    with parent_reload_status.get_lock():
+        return json.loads(parent_reload_status.value)
+
+def freeze_index():
+    # Move everything allocated so far (the index included) into the GC's
+    # permanent generation: collections in the workers then never walk,
+    # and so never write to, the shared index objects. Unfreezing first
+    # lets a replaced index be collected.
+    gc.unfreeze()
+    gc.collect()
+    gc.freeze()
+
+def spawn_worker(sock, host, port):
+    pid = os.fork()
+    if pid == 0:
+        # drop the parent's handlers; uvicorn installs its own
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        server = uvicorn.Server(uvicorn.Config(app, host=host, port=port))
+        server.run(sockets=[sock])
+        os._exit(0)
+    return pid
+
+def serve_prefork(host, port, workers):
+    # The parent loads the index once and forks the workers, which share
+    # its pages copy-on-write (reading the index still bumps refcounts, so
+    # a small part of it turns private per worker). Reloads happen in the
+    # parent only: on SIGHUP (sent by POST /admin/reload in any worker) or
+    # when the mtime watcher sees a change, it loads the new index,
+    # freezes it and replaces the workers one at a time, so every worker
+    # serves the same version and the index is never copied N times.
+    global prefork_parent, parent_reload_status, SCORING_WORKERS
+    prefork_parent = os.getpid()
+    SCORING_WORKERS = 1  # the workers already occupy the cores
+    parent_reload_status = multiprocessing.Array("c", RELOAD_STATUS_BYTES)
+    load_search_index()
+    publish_reload_status()
+    freeze_index()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+
+    children = [spawn_worker(sock, host, port) for _ in range(workers)]
+    print(f"Serving on http://{host}:{port} with {workers} pre-forked workers: {children}")
+
+    pending = {"reload": False, "stop": False}
+
+    def on_reload(signum, frame):
+        pending["reload"] = True
+
+    def on_stop(signum, frame):
+        pending["stop"] = True
+
+    signal.signal(signal.SIGHUP, on_reload)
+    signal.signal(signal.SIGINT, on_stop)
+    signal.signal(signal.SIGTERM, on_stop)
+
+    last_seen = database_mtimes()
+    last_check = time.monotonic()
+    while children and not pending["stop"]:
+        time.sleep(0.2)
+        for pid in list(children):
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                children.remove(pid)
+        if RELOAD_WATCH_INTERVAL and time.monotonic() - last_check >= RELOAD_WATCH_INTERVAL:
+            last_check = time.monotonic()
+            current = database_mtimes()
+            if current != last_seen:
+                last_seen = current
+                pending["reload"] = True
+        if pending["reload"]:
+            pending["reload"] = False
+            version = search_index["version"]
+            reload_databases()
+            if search_index["version"] != version:
+                freeze_index()
+                children = rolling_restart(children, sock, host, port)
+
+    for pid in children:
+        stop_worker(pid)
+    sock.close()
+
+def stop_worker(pid):
+    # uvicorn finishes in-flight requests on SIGTERM
+    try:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+    except (ProcessLookupError, ChildProcessError):
+        pass
+
+def rolling_restart(children, sock, host, port):
+    # Start each replacement before stopping the worker it replaces, so
+    # the socket never goes without workers
+    replaced = []
+    for pid in children:
+        replaced.append(spawn_worker(sock, host, port))
+        stop_worker(pid)
+    print(f"Workers now on version {search_index['version']}: {replaced}")
+    return replaced
+
+# -----------------------------------------------
+# HOT RELOAD
+# -----------------------------------------------
+
+reload_lock = threading.Lock()
+reload_status = {
+    "running": False,
+    "reloads": 0,
+    "last_reload": None,
+    "last_duration": None,
+    "last_error": None
+}
+
+def database_mtimes():
+    paths = [f"{DATA_DIR}/{file}" for file in DB_FILES] + [f"{DATA_DIR}/{DB_SNAPSHOT}"]
+    return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+
+def reload_databases():
+    # Builds a complete new index (all derived columns included) while the
+    # old one keeps serving, then publishes it with a single reference
+    # swap. Requests read the global once, so they see one index or the
+    # other, never a half-built one. Returns False if a reload is running.
+    # The rebuild holds the GIL for much of its run, so requests served by
+    # the same process slow down meanwhile (bench_search.py --reload); pre-
+    # forked workers are spared, as the parent rebuilds.
+    global search_index
+    if not reload_lock.acquire(blocking=False):
+        return False
+    try:
+        reload_status["running"] = True
+        publish_reload_status()
+        started = time.perf_counter()
+        new_index = load_databases(DB_FILES)
+        search_index = new_index
+        reload_status["reloads"] += 1
+        reload_status["last_reload"] = time.time()
+        reload_status["last_duration"] = time.perf_counter() - started
+        reload_status["last_error"] = None
+        print(f"Reloaded databases (version {new_index['version']}) in {reload_status['last_duration']:.2f}s")
+    except Exception as e:
+        # keep serving the previous index
+        reload_status["last_error"] = repr(e)
+        print("Database reload failed:", e)
+    finally:
+        reload_status["running"] = False
+        publish_reload_status()
+        reload_lock.release()
+    return True
+
+def watch_databases(interval, stop_event):
+    last_seen = database_mtimes()
+    while not stop_event.wait(interval):
+        current = database_mtimes()
+        if current != last_seen:
+            last_seen = current
+            reload_databases()
+
+@asynccontextmanager
+async def lifespan(app):
+    if search_index is None:
+        load_search_index()
+    stop_event = threading.Event()
+    # pre-forked workers leave watching to the parent (serve_prefork)
+    if RELOAD_WATCH_INTERVAL and prefork_parent is None:
+        threading.Thread(target=watch_databases, args=(RELOAD_WATCH_INTERVAL, stop_event), daemon=True).start()
+    yield
+    stop_event.set()
+
 # -----------------------------------------------
 # FASTAPI
 # -----------------------------------------------
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 class QueryRequest(BaseModel):
     text: str
+    mode: str = "matrix"  # "bounded": upper-bound pruning, adds pruning stats
+                          # "ngram": n-gram retrieval, then exact scoring
+    ngram_k: int = Field(NGRAM_TOP_K, ge=1)
+    top_n: int = Field(5, ge=1, le=MAX_TOP_N)
 
-engine_dicts = load_databases(DB_FILES)
+class BatchQueryRequest(BaseModel):
+    texts: list[str]
+    top_n: int = Field(5, ge=1, le=MAX_TOP_N)
 
 @app.post("/query")
-def query_three_step_endpoint(request: QueryRequest):
-    res = search_three_step(request.text, engine_dicts, top_n=5)
-    return {"query": request.text, "results": res}
+def query_three_step_endpoint(request: QueryRequest, response: Response):
+    timer = StageTimer()
+    started = time.perf_counter()
+    if request.mode == "bounded":
+        res, stats = search_bounded(request.text, search_index, top_n=request.top_n, timer=timer)
+        body = {"query": request.text, "results": res, "stats": stats}
+    elif request.mode == "ngram":
+        res, stats = search_ngram(request.text, search_index, top_n=request.top_n, k=request.ngram_k, timer=timer)
+        body = {"query": request.text, "results": res, "stats": stats}
+    else:
+        res = cached_search(request.text, search_index, top_n=request.top_n, timer=timer)
+        body = {"query": request.text, "results": res}
+    mode = request.mode if request.mode in ("bounded", "ngram") else "matrix"
+    if mode != "matrix":
+        cache = "bypass"  # these modes never read or fill the cache
+    else:
+        cache = "miss" if "brand_filter" in timer.stages else "hit"
+    metrics.record("query", timer, time.perf_counter() - started, mode=mode, cache=cache)
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = timer.server_timing()
+    return body
+
+@app.post("/query/batch")
+def query_batch_endpoint(request: BatchQueryRequest):
+    timer = StageTimer()
+    started = time.perf_counter()
+    errors = {}
+    res = search_batch(request.texts, search_index, top_n=request.top_n, timer=timer, errors=errors)
+    metrics.record("batch", timer, time.perf_counter() - started)
+    return {
+        "results": [
+            {"query": text, "results": r, **({"error": errors[text]} if text in errors else {})}
+            for text, r in zip(request.texts, res)
+        ]
+    }
+
+@app.post("/admin/reload")
+def admin_reload_endpoint():
+    if prefork_parent is not None:
+        # reloading one worker would split the versions: the parent
+        # reloads and replaces every worker
+        os.kill(prefork_parent, signal.SIGHUP)
+        return {"status": "reloading in parent", "version": search_index["version"]}
+    if reload_status["running"]:
+        return {"status": "already running"}
+    threading.Thread(target=reload_databases, daemon=True).start()
+    return {"status": "reloading", "version": search_index["version"]}
+
+@app.get("/admin/reload")
+def admin_reload_status_endpoint():
+    if prefork_parent is not None:
+        # reloads run in the parent; "version" is this worker's, which
+        # lags "parent_version" until the rolling restart replaces it
+        status = read_parent_reload_status()
+        return {"version": search_index["version"], "parent_version": status.pop("version"), "managed_by": "parent", **status}
+    return {"version": search_index["version"], **reload_status}
+
+@app.get("/admin/startup")
+def admin_startup_endpoint():
+    return startup_status
+
+@app.get("/admin/memory")
+def admin_memory_endpoint():
+    # Answered by whichever worker takes the connection
+    return process_memory()
+
+@app.get("/cache/stats")
+def cache_stats_endpoint():
+    return query_cache.stats()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    cache = query_cache.stats()
+    lines = [
+        "# HELP dvx_query_cache_entries Entries in the /query result cache.",
+        "# TYPE dvx_query_cache_entries gauge",
+        f"dvx_query_cache_entries {cache['size']}"
+    ]
+    for name in ("hits", "misses", "evictions", "expirations"):
+        lines += [
+            f"# HELP dvx_query_cache_{name}_total Query cache {name}.",
+            f"# TYPE dvx_query_cache_{name}_total counter",
+            f"dvx_query_cache_{name}_total {cache[name]}"
+        ]
+    return PlainTextResponse(metrics.render() + "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
 
 # -----------------------------------------------
 # USAGE EXAMPLE
@@ -290,5 +1472,9 @@ def query_three_step_endpoint(request: QueryRequest):
 #         print("-" * 60)
 
 if __name__ == "__main__":
-    print("Loaded databases:", len(engine_dicts))
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    # python search_engine.py [--workers N]
+    workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else WORKERS
+    if workers > 1:
+        serve_prefork(HOST, PORT, workers)
+    else:
+        uvicorn.run(app, host=HOST, port=PORT)
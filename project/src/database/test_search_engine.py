@@ -0,0 +1,146 @@
+import json
+import os
+
+import pytest
+
+import search_engine as se
+from engine_snapshot import rows_from_engine_dicts
+
+# Equivalence of the search paths over DVX queries sampled from
+# apply-rule/engines.json:  cd project/src/database && python -m pytest -q
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENGINES_FILE = os.path.join(HERE, "..", "apply-rule", "engines.json")
+SAMPLE_SIZE = 400
+TOP_N = 5
+
+
+@pytest.fixture(scope="module")
+def index():
+    # Built from the JSON files: step2_fuzzy_search needs full entries
+    named_dicts = []
+    for file in se.DB_FILES:
+        with open(os.path.join(HERE, se.DATA_DIR, file), "r", encoding="utf-8") as f:
+            named_dicts.append((file, json.load(f)))
+    return se.build_search_index(rows_from_engine_dicts(named_dicts), "test")
+
+
+@pytest.fixture(scope="module")
+def queries():
+    with open(ENGINES_FILE, "r", encoding="utf-8") as f:
+        engines = json.load(f)["engineData"]
+    texts = list(dict.fromkeys(
+        " | ".join(e.get(f) or "" for f in ("brandName", "modelName", "typeName", "engineName"))
+        for e in engines
+    ))
+    step = max(len(texts) // SAMPLE_SIZE, 1)
+    return texts[::step][:SAMPLE_SIZE]
+
+
+def ranking(results):
+    return [(r["engine_code"], pytest.approx(r["score"])) for r in results]
+
+
+def test_matrix_matches_scalar_scorer(index, queries):
+    for query in queries:
+        query_tokens = se.parse_query(query)
+        columns = se.step1_brand_filter(query_tokens, index)
+        scalar = se.step2_fuzzy_search(query_tokens, se.partition_candidates(columns), TOP_N)
+        matrix = se.step2_matrix_search([query_tokens], columns, TOP_N)[0]
+        assert ranking(matrix) == ranking(scalar), query
+
+
+def test_bounded_matches_matrix(index, queries):
+    for query in queries:
+        query_tokens = se.parse_query(query)
+        columns = se.step1_brand_filter(query_tokens, index)
+        bounded, stats = se.step2_bounded_search(query_tokens, columns, TOP_N)
+        matrix = se.step2_matrix_search([query_tokens], columns, TOP_N)[0]
+        assert ranking(bounded) == ranking(matrix), query
+        assert stats["scored"] + stats["pruned"] == stats["candidates"]
+
+
+def test_batch_matches_single_queries(index, queries):
+    batch = queries + queries[:20]  # duplicates are answered once, in place
+    results = se.search_batch(batch, index, TOP_N)
+    assert len(results) == len(batch)
+    for query, res in zip(batch, results):
+        assert ranking(res) == ranking(se.search_three_step(query, index, TOP_N)), query
+
+
+def test_parse_query_tolerates_malformed_periods():
+    assert se.parse_query("bmw | 3 | F30 - 2012 -> 2015 -> 2019 | 320d")["year_start"] == 2012
+    assert se.parse_query("bmw | 3 | -> -> | 320d")["year_start"] is None
+
+
+def test_batch_shares_the_query_cache(index, queries):
+    se.query_cache.sync(None)
+    se.search_batch(queries[:10], index, TOP_N)
+    assert se.query_cache.stats()["size"] == 10
+    timer = se.StageTimer()
+    assert se.cached_search(queries[0], index, TOP_N, timer) == se.search_three_step(queries[0], index, TOP_N)
+    assert "score" not in timer.stages
+    timer = se.StageTimer()
+    se.search_batch(queries[:10], index, TOP_N, timer)
+    assert "brand_filter" not in timer.stages
+
+
+def test_merged_entry_is_in_every_brand_partition():
+    tokens = {"model": ["audia3"], "year": ["2012 - 2020"], "engine_type": "petrol", "engine_name": "czca", "chassis": []}
+    cars = [{"category": "AUDI A3"}, {"category": "SEAT LEON"}, {"category": "SKODA OCTAVIA"}, {"category": "AUDI Q2"}]
+    engine_dict = {"CZCA": {"engine_info": {}, "cars": cars, "tokens": tokens}}
+    index = se.build_search_index(rows_from_engine_dicts([("engine_data.json", engine_dict)]))
+    assert sorted(index["brands"]) == ["audi", "seat", "skoda"]
+    for brand in ("audi", "seat", "skoda"):
+        assert index["brands"][brand]["code"] == ["CZCA"]
+
+
+def test_ngram_retrieves_at_least_top_n(index):
+    query = "vw | golf | 7 - 2015 -> 2018 | 1.4 tsi | 150 | petrol"
+    for k in (-5, 0, 2):
+        results, stats = se.search_ngram(query, index, TOP_N, k)
+        assert len(results) == TOP_N and stats["retrieved"] == TOP_N
+
+
+def test_code_fast_path_scores_and_bmw_family_fallback(index):
+    results = se.search_three_step("bmw | 5 series | F10 | 530d N57 D30 xDrive | 258 | diesel", index, TOP_N)
+    assert results and all(r["engine_code"].replace(" ", "").startswith("N57D30") for r in results)
+    assert all(r["score"] == se.CODE_MATCH_SCORE for r in results)
+    fuzzy = se.search_three_step("bmw | 5 series | F10 | 530d | 258 | diesel", index, TOP_N)
+    assert all(r["score"] <= se.CODE_MATCH_SCORE for r in fuzzy)
+
+
+def test_batch_reports_a_malformed_query_without_failing_the_rest(index, queries):
+    malformed = "a | b | c | d | e | f | g"
+    errors = {}
+    results = se.search_batch([queries[0], malformed, queries[1]], index, TOP_N, errors=errors)
+    assert results[1] == [] and list(errors) == [malformed]
+    assert ranking(results[0]) == ranking(se.search_three_step(queries[0], index, TOP_N))
+    assert ranking(results[2]) == ranking(se.search_three_step(queries[1], index, TOP_N))
+
+
+def test_top_n_is_bounded():
+    for top_n in (-1, 0, se.MAX_TOP_N + 1):
+        with pytest.raises(ValueError):
+            se.BatchQueryRequest(texts=["bmw"], top_n=top_n)
+        with pytest.raises(ValueError):
+            se.QueryRequest(text="bmw", top_n=top_n)
+    assert se.QueryRequest(text="bmw").top_n == 5
+
+
+def test_prefork_workers_report_the_parent_reload_status(index, monkeypatch):
+    monkeypatch.setattr(se, "search_index", index)
+    monkeypatch.setattr(se, "prefork_parent", os.getpid())
+    monkeypatch.setattr(se, "parent_reload_status", se.multiprocessing.Array("c", se.RELOAD_STATUS_BYTES))
+    se.publish_reload_status()
+    pid = os.fork()
+    if pid == 0:
+        # stands in for the pre-fork parent after a failed reload
+        se.reload_status.update(reloads=1, last_error="ValueError('bad json')")
+        se.publish_reload_status()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    status = se.admin_reload_status_endpoint()
+    assert se.reload_status["reloads"] == 0
+    assert status["reloads"] == 1 and status["last_error"] == "ValueError('bad json')"
+    assert status["managed_by"] == "parent" and status["parent_version"] == status["version"] == "test"
@@ -65,21 +65,23 @@ class DVXScraper {
     console.log("✅ Browser initialized");
   }
 
-  /** Query Python FastAPI server for engine code */
-  async queryPythonEngine(queryText) {
+  /** Query Python FastAPI server for many engines in one round-trip */
+  async queryPythonEngineBatch(queryTexts) {
+    if (queryTexts.length === 0) return [];
     try {
-      const response = await axios.post("http://127.0.0.1:8000/query", {
-        text: queryText,
+      const response = await axios.post("http://127.0.0.1:8000/query/batch", {
+        texts: queryTexts,
+        top_n: 1,
+      });
+      // return top 1 result per query, in request order; a query the
+      // server could not handle comes back with an error and no results
+      return response.data.results.map((r) => {
+        if (r.error) console.error(`❌ Python could not match "${r.query}":`, r.error);
+        return r.results && r.results.length > 0 ? r.results[0] : null;
       });
-      const results = response.data.results;
-      if (results && results.length > 0) {
-        // return top 1 result
-        return results[0];
-      }
-      return null;
     } catch (err) {
-      console.error("❌ Error querying Python:", err.message);
-      return null;
+      console.error("❌ Error querying Python (batch):", err.message);
+      return queryTexts.map(() => null);
     }
   }
 
@@ -351,7 +353,13 @@ class DVXScraper {
 
             const engines = await this.scrapeEngines(t.url, t.name);
 
-            for (const e of engines) {
+            // --- Python integration: resolve all engines of this type at once ---
+            const queryTexts = engines.map(
+              (e) => `${brand.name} | ${model.name} | ${type.name} | ${`${e.name}`.trim()} | ${e.power} | ${e.type}`
+            );
+            const topPythonResults = await this.queryPythonEngineBatch(queryTexts);
+
+            for (const [engineIndex, e] of engines.entries()) {
 
               const engine = {
                 id: this.counters.engineId++,
@@ -364,10 +372,8 @@ class DVXScraper {
                 type: e.type
               };
 
-              // --- Python integration ---
-              const queryText = `${brand.name} | ${model.name} | ${type.name} | ${engine.name} | ${e.power} | ${e.type}`;
-              console.log(queryText);
-              const topPythonResult = await this.queryPythonEngine(queryText);
+              console.log(queryTexts[engineIndex]);
+              const topPythonResult = topPythonResults[engineIndex];
 
               if (topPythonResult) {
                 engine.code = topPythonResult.engine_code;
@@ -0,0 +1,129 @@
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from extract_engine_mapping import (build_mapping, build_nested_mapping, iter_mapping, iter_nested_mapping,
+                                    normalize_code, write_json_array, write_json_object)
+
+# Times build_mapping and the streaming writers (flat list and nested
+# mapping) on a synthetic master file (brands / models / types / engines
+# shaped like supreme-tuning-master.json),
+# and checks the indexed join against the old per-type scan of every engine
+# on a smaller master, where the scan still finishes.
+#
+#   python scripts/bench_engine_mapping.py [--engines 100000] [--scan-engines 5000]
+
+
+def synthetic_master(n_engines, seed=0):
+    rng = random.Random(seed)
+    n_types = max(1, n_engines // 5)
+    n_models = max(1, n_types // 10)
+    n_brands = max(1, min(40, n_models // 10))
+    brands = [{'id': b, 'name': f'Brand {b}'} for b in range(n_brands)]
+    models = [{'id': m, 'brandId': rng.randrange(n_brands), 'name': f'Model {m}'} for m in range(n_models)]
+    types = []
+    for t in range(n_types):
+        types.append({'id': t, 'modelId': rng.randrange(n_models), 'typeName': f'Type {t % 50}'})
+    engines = []
+    for e in range(n_engines):
+        t = types[rng.randrange(n_types)]
+        engines.append({
+            'id': e,
+            'modelId': t['modelId'],
+            'typeName': t['typeName'],
+            'name': f'{rng.choice([1.4, 1.6, 2.0, 3.0])} TFSI {rng.randrange(90, 400)}hp',
+            'code': rng.choice(['UNKNOWN', '', f'C{e:05X}']),
+            'startYear': rng.randrange(1990, 2024),
+            'endYear': rng.choice([None, rng.randrange(2000, 2026)])
+        })
+    return {'brands': brands, 'models': models, 'types': types, 'engines': engines}
+
+
+def scan_mapping(data):
+    # the previous build_mapping: one scan of every engine per (model, type)
+    mapping = []
+    brands = {b['id']: b['name'] for b in data.get('brands', [])}
+    models = {m['id']: m for m in data.get('models', [])}
+    types_by_model = {}
+    for t in data.get('types', []):
+        types_by_model.setdefault(t['modelId'], []).append(t)
+    engines = data.get('engines', [])
+    for brand_id, brand_name in brands.items():
+        for model in [m for m in models.values() if m.get('brandId') == brand_id]:
+            for t in types_by_model.get(model['id'], []):
+                type_name = t.get('typeName')
+                for e in [e for e in engines if e.get('modelId') == model['id'] and e.get('typeName') == type_name]:
+                    mapping.append({
+                        'brandName': brand_name,
+                        'modelName': model.get('name'),
+                        'typeName': type_name,
+                        'engineName': e.get('name'),
+                        'engineCode': normalize_code(e.get('code')),
+                        'startYear': e.get('startYear'),
+                        'endYear': e.get('endYear')
+                    })
+    return mapping
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def option(name, default):
+    if name in sys.argv:
+        return type(default)(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
+def main():
+    n_engines = option('--engines', 100000)
+    n_scan = option('--scan-engines', 5000)
+
+    small = synthetic_master(n_scan)
+    indexed, indexed_s = timed(build_mapping, small)
+    scanned, scan_s = timed(scan_mapping, small)
+    print(f'{n_scan} engines: indexed {indexed_s * 1000:.1f} ms, scan {scan_s * 1000:.1f} ms, '
+          f'identical={indexed == scanned}')
+
+    data = synthetic_master(n_engines)
+    mapping, build_s = timed(build_mapping, data)
+    print(f'{n_engines} engines: build_mapping {build_s * 1000:.1f} ms, {len(mapping)} entries')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dumped = Path(tmp) / 'dumps.json'
+        streamed = Path(tmp) / 'streamed.json'
+
+        tracemalloc.start()
+        _, dumps_s = timed(lambda: dumped.write_text(json.dumps(build_mapping(data), indent=2, ensure_ascii=False), encoding='utf8'))
+        dumps_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        _, stream_s = timed(write_json_array, streamed, iter_mapping(data))
+        stream_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print(f'json.dumps write: {dumps_s:.2f} s, peak {dumps_peak / 2**20:.1f} MiB')
+        print(f'streaming write:  {stream_s:.2f} s, peak {stream_peak / 2**20:.1f} MiB, '
+              f'identical={dumped.read_bytes() == streamed.read_bytes()}')
+
+        # engine_codes_mapping.json: the nested brand / model / type document
+        tracemalloc.start()
+        _, dumps_s = timed(lambda: dumped.write_text(json.dumps(build_nested_mapping(data), indent=2, ensure_ascii=False), encoding='utf8'))
+        dumps_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        _, stream_s = timed(write_json_object, streamed, iter_nested_mapping(data))
+        stream_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print(f'nested json.dumps write: {dumps_s:.2f} s, peak {dumps_peak / 2**20:.1f} MiB')
+        print(f'nested streaming write:  {stream_s:.2f} s, peak {stream_peak / 2**20:.1f} MiB, '
+              f'identical={dumped.read_bytes() == streamed.read_bytes()}')
+
+
+if __name__ == '__main__':
+    main()
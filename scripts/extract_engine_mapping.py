@@ -1,9 +1,12 @@
 import json
+from itertools import islice
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
 SRC = ROOT / 'project' / 'src' / 'supreme-tuning-master.json'
 OUT = ROOT / 'engine_codes_mapping.json'
+# flat brand / model / type / engine entries with a normalized engineCode
+OUT_FLAT = ROOT / 'engine_codes_list.json'
 
 def load_json(p: Path):
     try:
@@ -22,32 +25,35 @@ def normalize_code(code):
     return c
 
 
-def build_mapping(data):
-    mapping = []
+def iter_mapping(data):
+    """Mapping entries in brand / model / type / engine order, one at a time."""
     brands = {b['id']: b['name'] for b in data.get('brands', [])}
 
     # models by id
     models = {m['id']: m for m in data.get('models', [])}
 
+    # models by brand id
+    models_by_brand = {}
+    for m in models.values():
+        models_by_brand.setdefault(m.get('brandId'), []).append(m)
+
     # types by model id
     types_by_model = {}
     for t in data.get('types', []):
         types_by_model.setdefault(t['modelId'], []).append(t)
 
-    # engines list
-    engines = data.get('engines', [])
+    # engines by (model id, typeName), in master file order
+    engines_by_key = {}
+    for e in data.get('engines', []):
+        engines_by_key.setdefault((e.get('modelId'), e.get('typeName')), []).append(e)
 
     for brand_id, brand_name in brands.items():
-        # find models for this brand
-        brand_models = [m for m in models.values() if m.get('brandId') == brand_id]
-        for model in brand_models:
+        for model in models_by_brand.get(brand_id, []):
             model_name = model.get('name')
             for t in types_by_model.get(model['id'], []):
                 type_name = t.get('typeName')
-                # find engines matching model id and typeName
-                matched = [e for e in engines if e.get('modelId') == model['id'] and e.get('typeName') == type_name]
-                for e in matched:
-                    entry = {
+                for e in engines_by_key.get((model['id'], type_name), []):
+                    yield {
                         'brandName': brand_name,
                         'modelName': model_name,
                         'typeName': type_name,
@@ -56,56 +62,34 @@ def build_mapping(data):
                         'startYear': e.get('startYear'),
                         'endYear': e.get('endYear')
                     }
-                    mapping.append(entry)
-
-    return mapping
-
-
-def main():
-    data = load_json(SRC)
-    mapping = build_mapping(data)
-    OUT.write_text(json.dumps(mapping, indent=2, ensure_ascii=False), encoding='utf8')
-    total = len(mapping)
-    with_code = sum(1 for e in mapping if e['engineCode'])
-    missing = total - with_code
-    print(f'Wrote {OUT} — total entries: {total}, with engineCode: {with_code}, missing: {missing}')
-
-
-if __name__ == '__main__':
-    main()
-import json
-from pathlib import Path
-import sys
 
-ROOT = Path(__file__).resolve().parents[1]
-SRC = ROOT / 'project' / 'src' / 'supreme-tuning-master.json'
-OUT = ROOT / 'engine_codes_mapping.json'
 
-def load_json(p: Path):
-    if not p.exists():
-        print(f'ERROR: source file not found: {p}', file=sys.stderr)
-        sys.exit(2)
-    return json.loads(p.read_text(encoding='utf8'))
+def build_mapping(data):
+    return list(iter_mapping(data))
 
-def main():
-    data = load_json(SRC)
 
-    mapping = {}
+def iter_nested_mapping(data):
+    """
+    (brand name, {model name: {type name: [engines]}}) pairs, one brand at a
+    time. A repeated brand or model name keeps its first position and the
+    contents of its last occurrence, as assigning into one dict would.
+    """
+    # brand name -> id of its last occurrence
+    brand_ids = {}
+    for b in data.get('brands', []):
+        brand_ids[b.get('name')] = b.get('id')
 
-    models = data.get('models', [])
-    types = data.get('types', [])
-    engines = data.get('engines', [])
+    models_by_brand = {}
+    for m in data.get('models', []):
+        models_by_brand.setdefault(m.get('brandId'), []).append(m)
 
-    # group types by modelId
     types_by_model = {}
-    for t in types:
+    for t in data.get('types', []):
         types_by_model.setdefault(t.get('modelId'), []).append(t)
 
-    # group engines by (modelId, typeName)
     engines_by_key = {}
-    for e in engines:
-        key = (e.get('modelId'), e.get('typeName'))
-        engines_by_key.setdefault(key, []).append({
+    for e in data.get('engines', []):
+        engines_by_key.setdefault((e.get('modelId'), e.get('typeName')), []).append({
             'id': e.get('id'),
             'name': e.get('name'),
             'code': None if e.get('code') in (None, '', 'UNKNOWN') else e.get('code'),
@@ -113,22 +97,74 @@ def main():
             'endYear': e.get('endYear')
         })
 
-    for brand in data.get('brands', []):
-        brand_name = brand.get('name')
-        mapping[brand_name] = {}
+    for brand_name, brand_id in brand_ids.items():
+        brand = {}
+        for m in models_by_brand.get(brand_id, []):
+            brand[m.get('name')] = {
+                t.get('typeName'): engines_by_key.get((m.get('id'), t.get('typeName')), [])
+                for t in types_by_model.get(m.get('id'), [])
+            }
+        yield brand_name, brand
+
+
+def build_nested_mapping(data):
+    return dict(iter_nested_mapping(data))
+
+
+def write_json_array(path: Path, items, batch=1000):
+    """
+    Write items as the same indent=2 array json.dumps would produce,
+    encoding `batch` elements at a time. Returns the number written.
+    """
+    encoder = json.JSONEncoder(indent=2, ensure_ascii=False)
+    items = iter(items)
+    count = 0
+    with open(path, 'w', encoding='utf8') as f:
+        f.write('[')
+        while chunk := list(islice(items, batch)):
+            # "[\n  {...},\n  {...}\n]" -> the elements with their separators
+            f.write((',' if count else '') + encoder.encode(chunk)[1:-2])
+            count += len(chunk)
+        f.write('\n]' if count else ']')
+    return count
+
+
+def write_json_object(path: Path, pairs, batch=1):
+    """
+    Write (key, value) pairs as the same indent=2 object json.dumps would
+    produce, encoding `batch` members at a time. Keys must be distinct.
+    Returns the number written.
+    """
+    encoder = json.JSONEncoder(indent=2, ensure_ascii=False)
+    pairs = iter(pairs)
+    count = 0
+    with open(path, 'w', encoding='utf8') as f:
+        f.write('{')
+        while chunk := list(islice(pairs, batch)):
+            # '{\n  "key": ...\n}' -> the members with their separators
+            f.write((',' if count else '') + encoder.encode(dict(chunk))[1:-2])
+            count += len(chunk)
+        f.write('\n}' if count else '}')
+    return count
 
-        brand_models = [m for m in models if m.get('brandId') == brand.get('id')]
-        for m in brand_models:
-            model_name = m.get('name')
-            mapping[brand_name][model_name] = {}
 
-            for t in types_by_model.get(m.get('id'), []):
-                type_name = t.get('typeName')
-                key = (m.get('id'), type_name)
-                mapping[brand_name][model_name][type_name] = engines_by_key.get(key, [])
+def main():
+    data = load_json(SRC)
+    with_code = 0
+
+    def counted(entries):
+        nonlocal with_code
+        for e in entries:
+            with_code += bool(e['engineCode'])
+            yield e
+
+    total = write_json_array(OUT_FLAT, counted(iter_mapping(data)))
+    missing = total - with_code
+    print(f'Wrote {OUT_FLAT} — total entries: {total}, with engineCode: {with_code}, missing: {missing}')
+
+    brands = write_json_object(OUT, iter_nested_mapping(data))
+    print(f'Wrote {OUT} — brands: {brands}')
 
-    OUT.write_text(json.dumps(mapping, indent=2, ensure_ascii=False), encoding='utf8')
-    print('Wrote', OUT)
 
 if __name__ == '__main__':
     main()